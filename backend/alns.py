@@ -0,0 +1,444 @@
+import math
+import random
+import time
+import numpy as np
+from distance_oracle import DistanceOracle, submatrix
+from fleet_sweep import DEFAULT_VEHICLE_COST_KM
+from route_optimizer import two_opt
+
+
+class ALNS:
+    """Adaptive Large Neighborhood Search over a complete multi-vehicle solution.
+
+    Routes are closed tours kept as open lists (the edge back to the first
+    stop is implied). Each iteration removes stops with a destroy operator
+    and reinserts them with a repair operator, both chosen by roulette over
+    adaptive weights. Stops can move between routes, so cluster borders get
+    repaired. Route loads, costs and edge lengths are cached per route and
+    only recomputed for routes a move touches; a rejected move is undone
+    from a journal of just those routes.
+
+    Every route also costs route_cost km, as in the fleet sweep, so repair
+    opens a new route when that is cheaper than the best insertion, and the
+    search can close routes. Operator weights are updated every
+    segment_length iterations, or after a segments-th of the search time
+    when iterations are slow.
+
+    time_budget covers the whole solve, including the initial capacity
+    repair and the 2-opt polish.
+    """
+
+    def __init__(self, distance_matrix, demands, vehicle_capacity, time_budget=2.0,
+                 max_iterations=10000, removal_fraction=(0.1, 0.3), max_removal=40,
+                 reaction_factor=0.1, segment_length=50, segments=10,
+                 route_cost=DEFAULT_VEHICLE_COST_KM, seed=42):
+        self.distance_matrix = distance_matrix
+        self.demands = np.asarray(demands)
+        self.vehicle_capacity = vehicle_capacity
+        self.time_budget = time_budget
+        self.max_iterations = max_iterations
+        self.removal_fraction = removal_fraction
+        self.max_removal = max_removal
+        self.reaction_factor = reaction_factor
+        self.segment_length = segment_length
+        self.segments = segments
+        self.route_cost = route_cost
+        self.random = random.Random(seed)
+
+        self.destroy_operators = [self.random_removal, self.worst_removal, self.shaw_removal]
+        self.repair_operators = [self.greedy_insertion, self.regret_insertion]
+
+        # Scores for a new global best, an improvement, and an accepted move
+        self.scores = (33, 9, 13)
+        self.journal = None
+
+    # ----- solution state -------------------------------------------------
+
+    def load_solution(self, routes, unassigned=(), deadline=None):
+        """Set the current solution; stops over capacity are moved to unassigned.
+
+        The costliest stops go first; past the deadline, trailing stops are
+        cut off instead.
+        """
+        self.routes = [list(route) for route in routes if len(route) > 0]
+        self.loads = [int(self.demands[route].sum()) for route in self.routes]
+        self.edges = [None] * len(self.routes)
+        self.costs = [self.tour_cost(r) for r in range(len(self.routes))]
+
+        unassigned = list(unassigned)
+        for r in range(len(self.routes)):
+            while self.loads[r] > self.vehicle_capacity and len(self.routes[r]) > 1:
+                if deadline is not None and time.time() >= deadline:
+                    fits = np.cumsum(self.demands[self.routes[r]]) <= self.vehicle_capacity
+                    keep = max(int(fits.sum()), 1)
+                    unassigned.extend(self.routes[r][keep:])
+                    self.routes[r] = self.routes[r][:keep]
+                    self.touch(r)
+                    break
+                gains = self.removal_gains(r)
+                stop = self.routes[r][int(np.argmax(gains))]
+                self.remove_stops({stop})
+                unassigned.append(stop)
+        self.drop_empty_routes()
+        return unassigned
+
+    def route_edges(self, r):
+        """Cached (from, to, length) arrays for every edge of route r"""
+        if self.edges[r] is None:
+            route = np.asarray(self.routes[r], dtype=int)
+            following = np.concatenate((route[1:], route[:1]))
+            lengths = np.asarray(self.distance_matrix[route, following], dtype=float)
+            self.edges[r] = (route, following, lengths)
+        return self.edges[r]
+
+    def tour_cost(self, r):
+        if len(self.routes[r]) < 2:
+            return 0.0
+        return float(self.route_edges(r)[2].sum())
+
+    def touch(self, r):
+        """Refresh cached values after route r changed"""
+        self.edges[r] = None
+        self.loads[r] = int(self.demands[self.routes[r]].sum()) if self.routes[r] else 0
+        self.costs[r] = self.tour_cost(r) if self.routes[r] else 0.0
+
+    def total_cost(self):
+        return float(sum(self.costs))
+
+    def objective(self):
+        """Distance plus route_cost for every route still in use"""
+        return self.total_cost() + self.route_cost * sum(1 for route in self.routes if route)
+
+    def snapshot(self):
+        return ([route[:] for route in self.routes], self.loads[:], self.costs[:], self.edges[:])
+
+    def restore(self, state):
+        routes, loads, costs, edges = state
+        self.routes = [route[:] for route in routes]
+        self.loads = loads[:]
+        self.costs = costs[:]
+        self.edges = edges[:]
+
+    def begin_move(self):
+        """Start journaling route changes so the move can be undone"""
+        self.journal = {}
+        self.journal_size = len(self.routes)
+
+    def record(self, r):
+        """Save route r before the current move first changes it"""
+        if self.journal is not None and r < self.journal_size and r not in self.journal:
+            self.journal[r] = (self.routes[r][:], self.loads[r], self.costs[r], self.edges[r])
+
+    def undo_move(self):
+        for r, (route, load, cost, edges) in self.journal.items():
+            self.routes[r], self.loads[r], self.costs[r], self.edges[r] = route, load, cost, edges
+        # Routes opened by the move are dropped again
+        for values in (self.routes, self.loads, self.costs, self.edges):
+            del values[self.journal_size:]
+        self.journal = None
+
+    def accept_move(self):
+        self.journal = None
+        self.drop_empty_routes()
+
+    def drop_empty_routes(self):
+        keep = [r for r in range(len(self.routes)) if self.routes[r]]
+        if len(keep) < len(self.routes):
+            self.routes = [self.routes[r] for r in keep]
+            self.loads = [self.loads[r] for r in keep]
+            self.costs = [self.costs[r] for r in keep]
+            self.edges = [self.edges[r] for r in keep]
+
+    def remove_stops(self, stops):
+        """Take stops out of their routes; emptied routes stay until the move is accepted"""
+        changed = [r for r, route in enumerate(self.routes) if not stops.isdisjoint(route)]
+        for r in changed:
+            self.record(r)
+            self.routes[r] = [s for s in self.routes[r] if s not in stops]
+            self.touch(r)
+
+    def removal_gains(self, r):
+        """Cost saved by removing each stop of route r"""
+        route, following, lengths = self.route_edges(r)
+        if len(route) < 2:
+            return np.zeros(len(route))
+        previous = np.roll(route, 1)
+        return (np.roll(lengths, 1) + lengths
+                - np.asarray(self.distance_matrix[previous, following], dtype=float))
+
+    def insertion_costs(self, stops, r):
+        """Best extra cost and position for inserting each of stops into route r.
+
+        Stops that would overload the route, or an emptied route, get an
+        infinite cost.
+        """
+        fits = self.loads[r] + self.demands[stops] <= self.vehicle_capacity
+        if len(self.routes[r]) == 0 or not fits.any():
+            return np.full(len(stops), np.inf), np.ones(len(stops), dtype=int)
+        route, following, lengths = self.route_edges(r)
+        column = stops[:, None]
+        delta = (np.asarray(self.distance_matrix[route[None, :], column], dtype=float)
+                 + np.asarray(self.distance_matrix[column, following[None, :]], dtype=float)
+                 - lengths[None, :])
+        positions = np.argmin(delta, axis=1)
+        costs = delta[np.arange(len(stops)), positions]
+        costs[~fits] = np.inf
+        return costs, positions + 1
+
+    # ----- destroy operators ----------------------------------------------
+
+    def assigned_stops(self):
+        return [stop for route in self.routes for stop in route]
+
+    def random_removal(self, n_remove):
+        stops = self.assigned_stops()
+        removed = self.random.sample(stops, min(n_remove, len(stops)))
+        self.remove_stops(set(removed))
+        return removed
+
+    def worst_removal(self, n_remove, randomness=3):
+        candidates = []
+        for r in range(len(self.routes)):
+            gains = self.removal_gains(r)
+            candidates.extend(zip(gains.tolist(), self.routes[r]))
+        candidates.sort(reverse=True)
+
+        removed = []
+        while candidates and len(removed) < n_remove:
+            # Biased towards the costliest stops, with some randomness
+            pick = int(len(candidates) * self.random.random() ** randomness)
+            removed.append(candidates.pop(pick)[1])
+        self.remove_stops(set(removed))
+        return removed
+
+    def shaw_removal(self, n_remove):
+        """Remove a seed stop together with the stops closest to it"""
+        stops = np.asarray(self.assigned_stops(), dtype=int)
+        seed = stops[self.random.randrange(len(stops))]
+        distances = np.asarray(self.distance_matrix[np.full(len(stops), seed), stops], dtype=float)
+        removed = stops[np.argsort(distances)[:n_remove]].tolist()
+        self.remove_stops(set(removed))
+        return removed
+
+    # ----- repair operators -----------------------------------------------
+
+    def greedy_insertion(self, removed):
+        self.insert_all(removed, regret=1)
+
+    def regret_insertion(self, removed):
+        self.insert_all(removed, regret=2)
+
+    def insert_all(self, removed, regret, deadline=None):
+        """Insert every removed stop, choosing by cheapest cost or by regret.
+
+        A pending-stops x routes table of insertion costs is built once, and
+        after each insertion only the column of the route that changed is
+        recomputed. Opening a new route is one more option, at route_cost.
+        Stops still pending at the deadline go to extra vehicles.
+        """
+        pending = np.asarray(removed, dtype=int)
+        costs = np.empty((len(pending), len(self.routes)))
+        positions = np.empty((len(pending), len(self.routes)), dtype=int)
+        for r in range(len(self.routes)):
+            costs[:, r], positions[:, r] = self.insertion_costs(pending, r)
+
+        while len(pending):
+            if deadline is not None and time.time() >= deadline:
+                self.dispatch_extra_vehicles(pending.tolist())
+                return
+
+            # The last column is a new route of its own
+            options = np.hstack([costs, np.full((len(pending), 1), float(self.route_cost))])
+            cheapest = options.min(axis=1)
+            if regret == 1 or options.shape[1] < 2:
+                priority = -cheapest
+            else:
+                # Larger regret means waiting would cost more
+                runner_up = np.partition(options, 1, axis=1)[:, 1]
+                with np.errstate(invalid='ignore'):
+                    priority = np.nan_to_num(runner_up - cheapest, nan=0.0)
+
+            i = int(np.argmax(priority))
+            stop = int(pending[i])
+
+            if np.argmin(options[i]) == costs.shape[1]:
+                # Cheaper, or only possible, on an extra vehicle
+                r = self.open_route()
+                self.routes[r].append(stop)
+                costs = np.hstack([costs, np.empty((len(pending), 1))])
+                positions = np.hstack([positions, np.empty((len(pending), 1), dtype=int)])
+            else:
+                r = int(np.argmin(costs[i]))
+                self.record(r)
+                self.routes[r].insert(int(positions[i, r]), stop)
+            self.touch(r)
+
+            pending = np.delete(pending, i)
+            costs = np.delete(costs, i, axis=0)
+            positions = np.delete(positions, i, axis=0)
+            if len(pending):
+                costs[:, r], positions[:, r] = self.insertion_costs(pending, r)
+
+    def open_route(self):
+        """Add an empty route for an extra vehicle and return its index"""
+        self.routes.append([])
+        self.loads.append(0)
+        self.costs.append(0.0)
+        self.edges.append(None)
+        return len(self.routes) - 1
+
+    def dispatch_extra_vehicles(self, stops):
+        """Pack stops, in the given order, onto new routes up to capacity"""
+        r = None
+        for stop in stops:
+            if r is None or self.loads[r] + self.demands[stop] > self.vehicle_capacity:
+                r = self.open_route()
+            self.routes[r].append(stop)
+            self.touch(r)
+
+    # ----- search ---------------------------------------------------------
+
+    def select(self, weights):
+        return self.random.choices(range(len(weights)), weights=weights)[0]
+
+    def solve(self, routes, unassigned=()):
+        """Improve the given routes until the time budget or iteration limit runs out.
+
+        Returns (routes, total distance, stats); each route is closed, i.e.
+        its first stop is repeated at the end.
+        """
+        start_time = time.time()
+        deadline = start_time + self.time_budget
+        unassigned = self.load_solution(routes, unassigned, deadline)
+        loaded_cost = self.total_cost()
+        if unassigned:
+            self.insert_all(unassigned, regret=1, deadline=deadline)
+        repair_cost = self.total_cost() - loaded_cost
+        polish_start = time.time()
+        polished = self.polish_routes(deadline)
+        # Keep back as long as that polish took (up to a quarter of the budget)
+        # to polish the routes the search changes
+        search_start = time.time()
+        search_deadline = deadline - min(search_start - polish_start, 0.25 * self.time_budget)
+
+        n_stops = len(self.assigned_stops())
+        current_cost = best_cost = self.objective()
+        best_state = self.snapshot()
+        repaired_distance = self.total_cost()
+
+        destroy_weights = [1.0] * len(self.destroy_operators)
+        repair_weights = [1.0] * len(self.repair_operators)
+        destroy_scores = [0.0] * len(destroy_weights)
+        repair_scores = [0.0] * len(repair_weights)
+        destroy_uses = [0] * len(destroy_weights)
+        repair_uses = [0] * len(repair_weights)
+
+        # A move 5% worse than the start is initially accepted half the time
+        start_temperature = 0.05 * max(current_cost, 1e-9) / math.log(2)
+
+        segment_seconds = (search_deadline - search_start) / self.segments
+        segment_end = search_start + segment_seconds
+        segment_iterations = 0
+
+        iteration = 0
+        while iteration < self.max_iterations and n_stops > 1:
+            now = time.time()
+            if now >= search_deadline:
+                break
+            if segment_iterations >= self.segment_length or (segment_iterations and now >= segment_end):
+                self.update_weights(destroy_weights, destroy_scores, destroy_uses)
+                self.update_weights(repair_weights, repair_scores, repair_uses)
+                segment_end = now + segment_seconds
+                segment_iterations = 0
+            progress = (now - search_start) / max(search_deadline - search_start, 1e-9)
+            temperature = start_temperature * 0.001 ** progress
+
+            low, high = self.removal_fraction
+            n_remove = max(1, int(n_stops * self.random.uniform(low, high)))
+            n_remove = min(n_remove, self.max_removal)
+            d = self.select(destroy_weights)
+            p = self.select(repair_weights)
+
+            self.begin_move()
+            removed = self.destroy_operators[d](n_remove)
+            self.repair_operators[p](removed)
+            candidate_cost = self.objective()
+
+            score = 0
+            if candidate_cost < best_cost - 1e-9:
+                score = self.scores[0]
+            elif candidate_cost < current_cost - 1e-9:
+                score = self.scores[1]
+            elif self.random.random() < math.exp((current_cost - candidate_cost) / temperature):
+                score = self.scores[2]
+
+            if score:
+                self.accept_move()
+                current_cost = candidate_cost
+                if score == self.scores[0]:
+                    best_cost = candidate_cost
+                    best_state = self.snapshot()
+            else:
+                self.undo_move()
+
+            destroy_scores[d] += score
+            repair_scores[p] += score
+            destroy_uses[d] += 1
+            repair_uses[p] += 1
+
+            iteration += 1
+            segment_iterations += 1
+
+        self.restore(best_state)
+        self.polish_routes(deadline, skip=polished)
+
+        stats = {
+            'iterations': iteration,
+            'elapsed_seconds': round(time.time() - start_time, 3),
+            # Stops moved off overloaded routes and the distance that added,
+            # before the search started
+            'repaired_stops': len(unassigned),
+            'capacity_repair_km': round(repair_cost, 2),
+            'repaired_distance_km': round(repaired_distance, 2),
+            'routes': len(self.routes),
+            'destroy_weights': dict(zip(
+                [op.__name__ for op in self.destroy_operators], [round(w, 3) for w in destroy_weights]
+            )),
+            'repair_weights': dict(zip(
+                [op.__name__ for op in self.repair_operators], [round(w, 3) for w in repair_weights]
+            )),
+        }
+        closed_routes = [route + [route[0]] for route in self.routes]
+        return closed_routes, self.total_cost(), stats
+
+    def update_weights(self, weights, scores, uses):
+        """Blend each operator's weight with its average score over the segment"""
+        for i in range(len(weights)):
+            if uses[i]:
+                weights[i] = ((1 - self.reaction_factor) * weights[i]
+                              + self.reaction_factor * scores[i] / uses[i])
+                weights[i] = max(weights[i], 0.05)
+            scores[i] = 0.0
+            uses[i] = 0
+
+    def polish_routes(self, deadline=None, skip=frozenset()):
+        """Intra-route 2-opt pass on every route not in skip, until the deadline.
+
+        Returns the polished routes as tuples, to skip them next time.
+        """
+        polished = set()
+        for r, route in enumerate(self.routes):
+            if deadline is not None and time.time() >= deadline:
+                break
+            if len(route) < 4 or tuple(route) in skip:
+                continue
+            route_matrix = submatrix(self.distance_matrix, route)
+            if isinstance(route_matrix, DistanceOracle):
+                # Routes are short, and 2-opt prices them far faster dense
+                route_matrix = route_matrix.to_dense()
+            local_route, _ = two_opt(list(range(len(route))) + [0], route_matrix)
+            self.routes[r] = [route[i] for i in local_route[:-1]]
+            self.touch(r)
+            polished.add(tuple(self.routes[r]))
+        return polished
+
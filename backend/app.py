@@ -1,12 +1,12 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-from data_loader import generate_sample_data, create_distance_matrix, load_kaggle_vrp_data
-from clustering import DeliveryClusterer
-from route_optimizer import VRPOptimizer, nearest_neighbor_heuristic, two_opt
-from genetic_algorithm import GeneticVRP, apply_genetic_to_clusters
-from traffic_predictor import TrafficPredictor, RealTimeTraffic
+from data_loader import generate_sample_data
+from traffic_predictor import RealTimeTraffic
+from shared_state import get_shared_state
+from route_cache import RouteCache
+from fleet_sweep import FleetSizingError
+from pipeline import RoutingPipeline, IMPROVER_NAMES
+from bounds import optimality_gap
 import os
 
 app = Flask(__name__)
@@ -18,6 +18,27 @@ os.makedirs('data', exist_ok=True)
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', 'YOUR_API_KEY_HERE')
 traffic_api = RealTimeTraffic(api_key=GOOGLE_MAPS_API_KEY)
 
+# Built at import time so a preloading server shares it with every worker
+shared_state = get_shared_state()
+
+route_cache = RouteCache(
+    max_entries=int(os.getenv('ROUTE_CACHE_SIZE', 4096)),
+    path=os.getenv('ROUTE_CACHE_PATH')
+)
+
+def make_pipeline(**options):
+    return RoutingPipeline(shared_state, route_cache, traffic_api, **options)
+
+def gap_percent(distance, lower_bound):
+    return round(optimality_gap(distance, lower_bound) * 100, 2)
+
+def fleet_options(data):
+    return {key: data[key] for key in ('fleet_range', 'vehicle_cost_km') if key in data}
+
+@app.errorhandler(FleetSizingError)
+def fleet_sizing_error(error):
+    return jsonify({'success': False, 'error': str(error)}), 400
+
 @app.route('/api/generate-data', methods=['POST'])
 def generate_data():
     """Generate sample delivery data"""
@@ -34,83 +55,60 @@ def generate_data():
 def cluster_deliveries():
     """Perform clustering on delivery locations"""
     data = request.json
-    df = pd.DataFrame(data['deliveries'])
     method = data.get('method', 'kmeans')
-    n_vehicles = data.get('n_vehicles', 5)
-    
-    clusterer = DeliveryClusterer(df)
-    
+    pipeline = make_pipeline(
+        deliveries=data['deliveries'],
+        method=method,
+        n_vehicles=data.get('n_vehicles', 5),
+        vehicle_capacity=300,
+        fleet_options=fleet_options(data)
+    )
+    
+    clustered = pipeline.cluster()
     if method == 'kmeans':
-        df, centers = clusterer.kmeans_cluster(n_vehicles)
         result = {
-            'clustered_data': df.to_dict(orient='records'),
-            'centers': centers.tolist(),
+            'clustered_data': clustered['df'].to_dict(orient='records'),
+            'centers': clustered['centers'].tolist(),
             'method': 'K-Means'
         }
+        if pipeline.fleet_sweep_summary():
+            result['fleet_sweep'] = pipeline.fleet_sweep_summary()
     else:
-        df, n_clusters, n_outliers = clusterer.dbscan_cluster()
         result = {
-            'clustered_data': df.to_dict(orient='records'),
-            'n_clusters': n_clusters,
-            'n_outliers': n_outliers,
+            'clustered_data': clustered['df'].to_dict(orient='records'),
+            'n_clusters': clustered['n_clusters'],
+            'n_outliers': clustered['n_outliers'],
             'method': 'DBSCAN'
         }
     
-    df = clusterer.balance_vehicle_capacity(vehicle_capacity=300)
-    
     return jsonify({
         'success': True,
         'result': result,
-        'balanced_data': df.to_dict(orient='records')
+        'balanced_data': pipeline.balance().to_dict(orient='records')
     })
 
 @app.route('/api/optimize-routes', methods=['POST'])
 def optimize_routes():
     """Optimize routes using 2-Opt heuristic"""
     data = request.json
-    df = pd.DataFrame(data['deliveries'])
-    
-    distance_matrix = create_distance_matrix(df)
+    pipeline = make_pipeline(
+        deliveries=data['deliveries'], method=None, vehicle_capacity=None, improver='two_opt',
+        target_gap=data.get('target_gap')
+    )
     
+    before = pipeline.construct()
+    after = pipeline.improve()
     all_routes = []
-    total_distance_before = 0
-    total_distance_after = 0
-    
-    for cluster_id in df['cluster'].unique():
-        if cluster_id == -1:
-            continue
-        
-        cluster_df = df[df['cluster'] == cluster_id].reset_index(drop=True)
-        
-        if len(cluster_df) < 2:
-            continue
-        
-        cluster_indices = df[df['cluster'] == cluster_id].index.tolist()
-        cluster_dist_matrix = distance_matrix[np.ix_(cluster_indices, cluster_indices)]
-        
-        nn_route, nn_distance = nearest_neighbor_heuristic(cluster_dist_matrix)
-        total_distance_before += nn_distance
-        
-        opt_route, opt_distance = two_opt(nn_route, cluster_dist_matrix)
-        total_distance_after += opt_distance
-        
-        route_coords = [
-            {
-                'customer_id': int(cluster_df.iloc[i]['customer_id']),
-                'latitude': float(cluster_df.iloc[i]['latitude']),
-                'longitude': float(cluster_df.iloc[i]['longitude']),
-                'position': i
-            }
-            for i in opt_route
-        ]
-        
-        all_routes.append({
-            'cluster_id': int(cluster_id),
-            'route': route_coords,
-            'distance_km': round(opt_distance, 2),
-            'improvement': round(((nn_distance - opt_distance) / nn_distance * 100), 2)
-        })
-    
+    for cluster_id, route in after.items():
+        nn_distance = before[cluster_id]['distance']
+        route_dict = pipeline.route_to_dict(route, include_position=True, include_bound=True,
+                                            include_schedule=True)
+        route_dict['improvement'] = round(((nn_distance - route['distance']) / nn_distance * 100), 2)
+        all_routes.append(route_dict)
+    
+    total_distance_before = sum(route['distance'] for route in before.values())
+    total_distance_after = sum(route['distance'] for route in after.values())
+    lower_bound = sum(pipeline.route_bound(route) for route in after.values())
     improvement = round(((total_distance_before - total_distance_after) / total_distance_before * 100), 2)
     
     return jsonify({
@@ -118,41 +116,47 @@ def optimize_routes():
         'routes': all_routes,
         'total_distance_before_km': round(total_distance_before, 2),
         'total_distance_after_km': round(total_distance_after, 2),
-        'improvement_percent': improvement
+        'improvement_percent': improvement,
+        'lower_bound_km': round(lower_bound, 2),
+        'optimality_gap_percent': gap_percent(total_distance_after, lower_bound),
+        'schedule': pipeline.schedule_summary()
     })
 
 @app.route('/api/optimize-genetic', methods=['POST'])
 def optimize_genetic():
     """Optimize routes using Genetic Algorithm"""
     data = request.json
-    df = pd.DataFrame(data['deliveries'])
     use_traffic = data.get('use_traffic', False)
+    pipeline = make_pipeline(
+        deliveries=data['deliveries'], method=None, vehicle_capacity=None,
+        use_traffic=use_traffic, improver='genetic', target_gap=data.get('target_gap')
+    )
     
-    if use_traffic:
-        print("Using traffic-adjusted distances for genetic algorithm...")
-        distance_matrix = traffic_api.update_distance_matrix_with_traffic(df, sample_size=20)
-    else:
-        distance_matrix = create_distance_matrix(df)
-    
-    all_routes, total_distance = apply_genetic_to_clusters(df, distance_matrix)
+    routes = pipeline.improve()
+    total_distance = sum(route['distance'] for route in routes.values())
+    lower_bound = sum(pipeline.route_bound(route) for route in routes.values())
     
     return jsonify({
         'success': True,
-        'routes': all_routes,
+        'routes': [pipeline.route_to_dict(route, include_position=True, include_bound=True,
+                                          include_schedule=True)
+                   for route in routes.values()],
         'total_distance_km': round(total_distance, 2),
+        'lower_bound_km': round(lower_bound, 2),
+        'optimality_gap_percent': gap_percent(total_distance, lower_bound),
         'method': 'Genetic Algorithm',
+        'schedule': pipeline.schedule_summary(),
         'traffic_enabled': use_traffic
     })
 
 @app.route('/api/traffic-analysis', methods=['POST'])
 def traffic_analysis():
     """Analyze traffic patterns"""
-    predictor = TrafficPredictor()
-    traffic_patterns = predictor.generate_traffic_patterns()
+    traffic_patterns = shared_state.traffic_profile
     
     hours = list(range(24))
     patterns = [
-        {'hour': h, 'multiplier': round(traffic_patterns[h], 2)}
+        {'hour': h, 'multiplier': round(float(traffic_patterns[h]), 2)}
         for h in hours
     ]
     
@@ -165,117 +169,66 @@ def traffic_analysis():
 def full_optimization():
     """Complete optimization pipeline with comparison"""
     data = request.json
-    num_customers = data.get('num_customers', 50)
-    n_vehicles = data.get('n_vehicles', 5)
-    method = data.get('clustering_method', 'kmeans')
-    use_genetic = data.get('use_genetic', False)
     use_traffic = data.get('use_traffic', False)
-    
-    df = generate_sample_data(num_customers)
-    
-    clusterer = DeliveryClusterer(df)
-    if method == 'kmeans':
-        df, _ = clusterer.kmeans_cluster(n_vehicles)
-    else:
-        df, _, _ = clusterer.dbscan_cluster()
-    
-    df = clusterer.balance_vehicle_capacity()
- 
-    if use_traffic:
-        print("Fetching real-time traffic data...")
-        distance_matrix = traffic_api.update_distance_matrix_with_traffic(df, sample_size=20)
-    else:
-        distance_matrix = create_distance_matrix(df)
-    
-  
-    before_routes = []
-    before_total_distance = 0
-    
-    for cluster_id in df['cluster'].unique():
-        if cluster_id == -1:
-            continue
-        
-        cluster_df = df[df['cluster'] == cluster_id].reset_index(drop=True)
-        if len(cluster_df) < 2:
-            continue
-        
-        cluster_indices = df[df['cluster'] == cluster_id].index.tolist()
-        cluster_dist_matrix = distance_matrix[np.ix_(cluster_indices, cluster_indices)]
-        
-        nn_route, nn_distance = nearest_neighbor_heuristic(cluster_dist_matrix)
-        before_total_distance += nn_distance
-        
-        route_coords = [
-            {
-                'customer_id': int(cluster_df.iloc[i]['customer_id']),
-                'latitude': float(cluster_df.iloc[i]['latitude']),
-                'longitude': float(cluster_df.iloc[i]['longitude'])
-            }
-            for i in nn_route
-        ]
-        
-        before_routes.append({
-            'cluster_id': int(cluster_id),
-            'route': route_coords,
-            'distance_km': round(nn_distance, 2)
-        })
-    
-   
-    after_routes = []
-    after_total_distance = 0
-    
-    if use_genetic:
-        print("Running Genetic Algorithm optimization...")
-        after_routes, after_total_distance = apply_genetic_to_clusters(df, distance_matrix)
-        optimization_method = "Genetic Algorithm"
+    construction = data.get('construction', 'nearest_neighbor')
+    if data.get('use_genetic', False):
+        improver = 'genetic'
+    elif data.get('use_alns', False):
+        improver = 'alns'
+    elif construction == 'hilbert':
+        improver = 'window'
     else:
-        print("Running 2-Opt optimization...")
-        for cluster_id in df['cluster'].unique():
-            if cluster_id == -1:
-                continue
-            
-            cluster_df = df[df['cluster'] == cluster_id].reset_index(drop=True)
-            if len(cluster_df) < 2:
-                continue
-            
-            cluster_indices = df[df['cluster'] == cluster_id].index.tolist()
-            cluster_dist_matrix = distance_matrix[np.ix_(cluster_indices, cluster_indices)]
-            
-            nn_route, _ = nearest_neighbor_heuristic(cluster_dist_matrix)
-            opt_route, opt_distance = two_opt(nn_route, cluster_dist_matrix)
-            after_total_distance += opt_distance
-            
-            route_coords = [
-                {
-                    'customer_id': int(cluster_df.iloc[i]['customer_id']),
-                    'latitude': float(cluster_df.iloc[i]['latitude']),
-                    'longitude': float(cluster_df.iloc[i]['longitude'])
-                }
-                for i in opt_route
-            ]
-            
-            after_routes.append({
-                'cluster_id': int(cluster_id),
-                'route': route_coords,
-                'distance_km': round(opt_distance, 2)
-            })
-        
-        optimization_method = "2-Opt Heuristic"
-    
+        improver = 'two_opt'
+    
+    pipeline = make_pipeline(
+        num_customers=data.get('num_customers', 50),
+        method=data.get('clustering_method', 'kmeans'),
+        n_vehicles=data.get('n_vehicles', 5),
+        vehicle_capacity=200,
+        use_traffic=use_traffic,
+        improver=improver,
+        time_budget=data.get('time_budget', 2.0),
+        fleet_options=fleet_options(data),
+        target_gap=data.get('target_gap'),
+        construction=construction,
+        polish_window=data.get('polish_window', 8),
+        report_bounds=data.get('report_bounds')
+    )
+    
+    serialized = pipeline.serialize()
+    before_total_distance = serialized['before_distance_km']
+    after_total_distance = serialized['after_distance_km']
     improvement_percent = round(((before_total_distance - after_total_distance) / before_total_distance * 100), 2)
     
-    return jsonify({
+    response = {
         'success': True,
-        'deliveries': df.to_dict(orient='records'),
-        'before_routes': before_routes,
-        'after_routes': after_routes,
+        'deliveries': pipeline.routed_deliveries().to_dict(orient='records'),
+        'before_routes': serialized['before_routes'],
+        'after_routes': serialized['after_routes'],
         'before_distance_km': round(before_total_distance, 2),
         'after_distance_km': round(after_total_distance, 2),
         'improvement_percent': improvement_percent,
-        'num_vehicles': len(after_routes),
-        'optimization_method': optimization_method,
+        'num_vehicles': len(serialized['after_routes']),
+        'construction': construction,
+        'optimization_method': IMPROVER_NAMES[improver],
+        'schedule': serialized['schedule'],
         'traffic_enabled': use_traffic
-    })
+    }
+    if pipeline.report_bounds:
+        response['lower_bound_km'] = round(serialized['lower_bound_km'], 2)
+        response['optimality_gap_percent'] = gap_percent(after_total_distance, serialized['lower_bound_km'])
+    if pipeline.fleet_sweep_summary():
+        response['fleet_sweep'] = pipeline.fleet_sweep_summary()
+    if improver == 'alns':
+        # Constructed routes may overload vehicles; the search is measured
+        # from the routes after capacity repair
+        stats = dict(pipeline.results['alns_stats'])
+        repaired = stats['repaired_distance_km']
+        stats['search_improvement_percent'] = (
+            round((repaired - after_total_distance) / repaired * 100, 2) if repaired else 0.0)
+        response['alns'] = stats
+    
+    return jsonify(response)
 
 if __name__ == '__main__':
     print("="*50)
@@ -286,5 +239,6 @@ if __name__ == '__main__':
     else:
         print("✗ Real-time traffic API: DISABLED (using synthetic traffic)")
         print("  To enable: Set GOOGLE_MAPS_API_KEY environment variable")
+    print("  Production: gunicorn -c gunicorn.conf.py")
     print("="*50)
     app.run(debug=True, port=5000)
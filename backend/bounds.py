@@ -0,0 +1,144 @@
+import numpy as np
+from distance_oracle import DistanceOracle
+
+
+def _dense_symmetric(distance_matrix):
+    """Dense copy with c[i][j] = min(c[i][j], c[j][i]), which keeps bounds valid"""
+    if isinstance(distance_matrix, DistanceOracle):
+        matrix = distance_matrix.to_dense()
+    else:
+        matrix = np.asarray(distance_matrix, dtype=float)
+    return np.minimum(matrix, matrix.T)
+
+
+def minimum_spanning_tree(matrix):
+    """Prim's algorithm on a dense matrix; returns (weight, node degrees)"""
+    n = len(matrix)
+    degrees = np.zeros(n, dtype=int)
+    if n < 2:
+        return 0.0, degrees
+
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    best = matrix[0].astype(float)
+    parent = np.zeros(n, dtype=int)
+    weight = 0.0
+
+    for _ in range(n - 1):
+        candidates = np.where(in_tree, np.inf, best)
+        j = int(np.argmin(candidates))
+        weight += candidates[j]
+        in_tree[j] = True
+        degrees[j] += 1
+        degrees[parent[j]] += 1
+
+        closer = (matrix[j] < best) & ~in_tree
+        best = np.where(closer, matrix[j], best)
+        parent = np.where(closer, j, parent)
+
+    return float(weight), degrees
+
+
+def one_tree(matrix):
+    """Minimum 1-tree: spanning tree on nodes 1..n-1 plus node 0's two cheapest edges"""
+    weight, tree_degrees = minimum_spanning_tree(matrix[1:, 1:])
+    nearest = np.argsort(matrix[0, 1:])[:2]
+
+    degrees = np.zeros(len(matrix), dtype=int)
+    degrees[1:] = tree_degrees
+    degrees[0] = 2
+    degrees[nearest + 1] += 1
+    return weight + float(matrix[0, 1:][nearest].sum()), degrees
+
+
+def tour_lower_bound(distance_matrix, iterations=10, upper_bound=None):
+    """Lower bound on the shortest closed tour through every stop.
+
+    Starts from the 1-tree bound and tightens it with a few Held-Karp
+    subgradient iterations on node penalties. upper_bound (e.g. an
+    incumbent tour length) sets the step size; without one, twice the
+    spanning tree weight is used.
+    """
+    matrix = _dense_symmetric(distance_matrix)
+    n = len(matrix)
+    if n < 2:
+        return 0.0
+    if n == 2:
+        return 2 * float(matrix[0, 1])
+    if n == 3:
+        return float(matrix[0, 1] + matrix[1, 2] + matrix[2, 0])
+
+    if upper_bound is None:
+        upper_bound = 2 * minimum_spanning_tree(matrix)[0]
+
+    penalties = np.zeros(n)
+    best_bound = 0.0
+    step_scale = 2.0
+    stalled = 0
+
+    for _ in range(max(iterations, 1)):
+        weight, degrees = one_tree(matrix + penalties[:, None] + penalties[None, :])
+        bound = weight - 2 * penalties.sum()
+        if bound > best_bound + 1e-9:
+            best_bound = bound
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= 2:
+                step_scale /= 2
+                stalled = 0
+
+        subgradient = degrees - 2
+        norm = float(subgradient @ subgradient)
+        if norm == 0:
+            # Every node has degree two: the 1-tree is an optimal tour
+            break
+        step = step_scale * max(upper_bound - bound, 0) / norm
+        if step <= 0:
+            break
+        penalties += step * subgradient
+
+    return float(best_bound)
+
+
+def radial_lower_bound(distance_matrix, demands, vehicle_capacity, depot=0):
+    """Lower bound for capacitated routes from a depot: sum of 2 d(depot, i) q_i / Q.
+
+    A route carries at most Q and reaches its farthest stop and back, so it
+    costs at least twice the demand-weighted depot distance of its stops
+    over Q. Only the depot's row and column are looked up.
+    """
+    n = len(distance_matrix)
+    stops = np.arange(n)
+    depots = np.full(n, depot)
+    out = np.asarray(distance_matrix[depots, stops], dtype=float)
+    back = np.asarray(distance_matrix[stops, depots], dtype=float)
+    return float(2 * np.minimum(out, back) @ np.asarray(demands, dtype=float) / vehicle_capacity)
+
+
+def vrp_lower_bound(distance_matrix, demands, vehicle_capacity, depot=0):
+    """Lower bound on the total length of capacitated routes from a depot.
+
+    The better of the tour bound (under the triangle inequality any set of
+    depot routes shortcuts to one tour) and the radial bound, which is the
+    stronger one once many vehicles are needed. The tour bound needs a
+    dense matrix, so an oracle only gets the radial bound.
+    """
+    bound = radial_lower_bound(distance_matrix, demands, vehicle_capacity, depot)
+    if not isinstance(distance_matrix, DistanceOracle):
+        bound = max(bound, tour_lower_bound(distance_matrix))
+    return bound
+
+
+def optimality_gap(cost, lower_bound):
+    """Relative distance of a solution's cost from a lower bound (0.0 = proven optimal)"""
+    if cost <= 0:
+        return 0.0
+    return max(cost - lower_bound, 0.0) / cost
+
+
+def gap_reached(cost, lower_bound, target_gap):
+    """True once cost is within target_gap of lower_bound"""
+    if lower_bound is None or target_gap is None:
+        return False
+    return optimality_gap(cost, lower_bound) <= target_gap
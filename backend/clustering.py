@@ -6,8 +6,12 @@ class DeliveryClusterer:
         self.df = df
         self.coordinates = df[['latitude', 'longitude']].values
         
-    def kmeans_cluster(self, n_vehicles=5):
-        kmeans = KMeans(n_clusters=n_vehicles, random_state=42, n_init=10)
+    def kmeans_cluster(self, n_vehicles=5, init=None):
+        if init is None:
+            kmeans = KMeans(n_clusters=n_vehicles, random_state=42, n_init=10)
+        else:
+            # Warm start from known centroids, a single run is enough
+            kmeans = KMeans(n_clusters=n_vehicles, init=init, n_init=1)
         labels = kmeans.fit_predict(self.coordinates)
         self.df['cluster'] = labels
         return self.df, kmeans.cluster_centers_
@@ -13,6 +13,9 @@ def download_cvrplib_instance(instance_name="X-n101-k25"):
         print("Using sample data instead")
         return generate_sample_data()
 
+# Rewritten by every request that generates data; never a source of shared state
+SAMPLE_DATA_PATH = 'data/delivery_locations.csv'
+
 def generate_sample_data(num_customers=50):
     """Generate synthetic delivery data"""
     np.random.seed(42)
@@ -28,7 +31,7 @@ def generate_sample_data(num_customers=50):
     }
     
     df = pd.DataFrame(data)
-    df.to_csv('data/delivery_locations.csv', index=False)
+    df.to_csv(SAMPLE_DATA_PATH, index=False)
     return df
 
 def load_kaggle_vrp_data(filepath):
@@ -48,14 +51,6 @@ def haversine_distance(lat1, lon1, lat2, lon2):
 
 def create_distance_matrix(df):
     """Create distance matrix from coordinates"""
-    n = len(df)
-    matrix = np.zeros((n, n))
-    
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                matrix[i][j] = haversine_distance(
-                    df.iloc[i]['latitude'], df.iloc[i]['longitude'],
-                    df.iloc[j]['latitude'], df.iloc[j]['longitude']
-                )
-    return matrix
+    lat = df['latitude'].values.astype(float)
+    lon = df['longitude'].values.astype(float)
+    return haversine_distance(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+import numpy as np
+from data_loader import haversine_distance
+
+
+class DistanceOracle:
+    """Lazy stand-in for a dense distance matrix.
+
+    Costs are computed on demand from coordinates. Full rows are memoized in
+    a bounded LRU cache, so memory stays around n x cache_rows instead of n x n.
+    Supports the indexing forms the solvers use on an ndarray:
+
+        oracle[i]              -> row i (cached)
+        oracle[i, j]           -> single cost (from a cached row if there is one)
+        oracle[rows, cols]     -> vectorized batch of pair costs
+    """
+
+    def __init__(self, coordinates, multiplier=1.0, cache_rows=1024):
+        coordinates = np.asarray(coordinates, dtype=float)
+        self.lat = coordinates[:, 0]
+        self.lon = coordinates[:, 1]
+        self.multiplier = multiplier
+        self.cache_rows = cache_rows
+        self._rows = OrderedDict()
+
+    @classmethod
+    def from_dataframe(cls, df, hour=None, traffic_profile=None, cache_rows=1024):
+        """Build an oracle from lat/lon columns, optionally traffic-adjusted for an hour"""
+        multiplier = 1.0
+        if hour is not None:
+            if traffic_profile is None:
+                from traffic_predictor import TrafficPredictor
+                traffic_profile = TrafficPredictor().generate_traffic_patterns()
+            multiplier = float(traffic_profile[hour])
+        return cls(df[['latitude', 'longitude']].values, multiplier, cache_rows)
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def shape(self):
+        return (len(self), len(self))
+
+    def row(self, i):
+        """Distances from stop i to every stop"""
+        i = int(i)
+        row = self._rows.get(i)
+        if row is not None:
+            self._rows.move_to_end(i)
+            return row
+
+        row = haversine_distance(self.lat[i], self.lon[i], self.lat, self.lon) * self.multiplier
+        row.setflags(write=False)
+        self._rows[i] = row
+        if len(self._rows) > self.cache_rows:
+            self._rows.popitem(last=False)
+        return row
+
+    def pair(self, i, j):
+        """Single cost; computed directly so random lookups don't churn the row cache"""
+        i, j = int(i), int(j)
+        row = self._rows.get(i)
+        if row is not None:
+            return row[j]
+        return float(haversine_distance(self.lat[i], self.lon[i], self.lat[j], self.lon[j])
+                     * self.multiplier)
+
+    def pairs(self, rows, cols):
+        """Vectorized costs for the pairs (rows[k], cols[k])"""
+        rows = np.asarray(rows, dtype=int)
+        cols = np.asarray(cols, dtype=int)
+        return haversine_distance(
+            self.lat[rows], self.lon[rows], self.lat[cols], self.lon[cols]
+        ) * self.multiplier
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            if np.ndim(i) == 0 and np.ndim(j) == 0:
+                return self.pair(i, j)
+            return self.pairs(i, j)
+        return self.row(key)
+
+    def subset(self, indices):
+        """Lazy oracle over a subset of stops, re-indexed from 0"""
+        indices = np.asarray(indices, dtype=int)
+        coordinates = np.column_stack([self.lat[indices], self.lon[indices]])
+        return DistanceOracle(coordinates, self.multiplier, self.cache_rows)
+
+    def scaled(self, factor):
+        """Same oracle with every cost multiplied by factor"""
+        coordinates = np.column_stack([self.lat, self.lon])
+        return DistanceOracle(coordinates, self.multiplier * factor, self.cache_rows)
+
+    def to_dense(self):
+        """Materialize the full n x n matrix (only for small instances)"""
+        return haversine_distance(
+            self.lat[:, None], self.lon[:, None], self.lat[None, :], self.lon[None, :]
+        ) * self.multiplier
+
+
+def submatrix(distance_matrix, indices):
+    """Restrict a dense matrix or an oracle to the given stops"""
+    if isinstance(distance_matrix, DistanceOracle):
+        return distance_matrix.subset(indices)
+    return distance_matrix[np.ix_(indices, indices)]
+
+
+def route_distance(route, distance_matrix):
+    """Total length of a route, in one batched lookup"""
+    if len(route) < 2:
+        return 0.0
+    route = np.asarray(route, dtype=int)
+    return float(np.sum(distance_matrix[route[:-1], route[1:]]))
@@ -0,0 +1,78 @@
+import functools
+import os
+import numpy as np
+from distance_oracle import DistanceOracle
+
+# Clusters up to this many stops are solved exactly instead of heuristically
+EXACT_MAX_STOPS = int(os.getenv('EXACT_MAX_STOPS', 13))
+
+
+@functools.lru_cache(maxsize=None)
+def subset_layers(n_bits):
+    """Subset bitmasks of n_bits elements grouped by size, plus a membership table.
+
+    Cached per size, so the table is built once per process and shared by
+    every cluster with the same number of stops.
+    """
+    masks = np.arange(1 << n_bits)
+    members = ((masks[:, None] >> np.arange(n_bits)[None, :]) & 1).astype(bool)
+    sizes = members.sum(axis=1)
+    layers = [masks[sizes == size] for size in range(n_bits + 1)]
+    return layers, members
+
+
+def held_karp(distance_matrix):
+    """Optimal closed tour from stop 0 by bitmask dynamic programming.
+
+    cost[mask, j] is the shortest path that leaves stop 0, visits exactly
+    the stops in mask and ends at j. Each subset-size layer is computed for
+    all masks at once with NumPy. Time is O(2^n n^2) and memory O(2^n n), so
+    this is meant for clusters of up to about EXACT_MAX_STOPS stops.
+
+    Returns (route, distance) with the route closed at stop 0, like the
+    other solvers.
+    """
+    if isinstance(distance_matrix, DistanceOracle):
+        matrix = distance_matrix.to_dense()
+    else:
+        matrix = np.asarray(distance_matrix, dtype=float)
+
+    n = len(matrix)
+    if n < 3:
+        route = list(range(n)) + [0]
+        return route, float(sum(matrix[route[i], route[i + 1]] for i in range(len(route) - 1)))
+
+    # Bit j of a mask stands for stop j + 1; stop 0 is the fixed start
+    m = n - 1
+    inner = matrix[1:, 1:]
+    layers, members = subset_layers(m)
+
+    cost = np.full((1 << m, m), np.inf)
+    parent = np.full((1 << m, m), -1, dtype=np.int8 if m < 127 else np.int32)
+    singles = 1 << np.arange(m)
+    cost[singles, np.arange(m)] = matrix[0, 1:]
+
+    for size in range(2, m + 1):
+        layer = layers[size]
+        for j in range(m):
+            masks = layer[members[layer, j]]
+            previous = masks ^ (1 << j)
+            candidates = cost[previous] + inner[:, j][None, :]
+            best = np.argmin(candidates, axis=1)
+            cost[masks, j] = candidates[np.arange(len(masks)), best]
+            parent[masks, j] = best
+
+    full = (1 << m) - 1
+    closing = cost[full] + matrix[1:, 0]
+    last = int(np.argmin(closing))
+    distance = float(closing[last])
+
+    route = []
+    mask = full
+    while last >= 0:
+        route.append(last + 1)
+        previous = int(parent[mask, last])
+        mask ^= 1 << last
+        last = previous
+
+    return [0] + route[::-1] + [0], distance
@@ -0,0 +1,145 @@
+import multiprocessing
+import numpy as np
+from sklearn.cluster import KMeans
+from clustering import DeliveryClusterer
+from distance_oracle import submatrix
+from route_optimizer import nearest_neighbor_heuristic
+from worker_pool import process_pool, shared_matrix, attach_matrix
+
+# Fixed cost of dispatching one more vehicle, in km of driving
+DEFAULT_VEHICLE_COST_KM = 20
+
+
+class FleetSizingError(ValueError):
+    """A fleet sweep that was asked for sizes it cannot try"""
+
+
+# The instance being swept, set once in each worker process
+_sweep_df = None
+_sweep_matrix = None
+# Keeps the shared matrix mapped for as long as the worker lives
+_sweep_shm = None
+
+
+def _set_instance(df, distance_matrix, shm=None):
+    global _sweep_df, _sweep_matrix, _sweep_shm
+    _sweep_df = df
+    _sweep_matrix = distance_matrix
+    _sweep_shm = shm
+
+
+def _init_worker(df, matrix_ref):
+    _set_instance(df, *attach_matrix(matrix_ref))
+
+
+def default_fleet_range(df, vehicle_capacity):
+    """Fleet sizes worth trying: from the demand lower bound up to about twice it"""
+    low = max(1, int(np.ceil(df['demand'].sum() / vehicle_capacity)))
+    high = min(len(df), max(low + 4, 2 * low))
+    return low, max(low, high)
+
+
+def parse_fleet_range(fleet_range):
+    """Sizes from a [low, high] request value, inclusive"""
+    try:
+        low, high = (int(value) for value in fleet_range)
+    except (TypeError, ValueError):
+        raise FleetSizingError(f"fleet_range must be [low, high], got {fleet_range!r}")
+    if low < 1 or low > high:
+        raise FleetSizingError(f"fleet_range must satisfy 1 <= low <= high, got {fleet_range!r}")
+    return range(low, high + 1)
+
+
+def warm_start_centroids(df, sizes):
+    """Initial centroids for every fleet size from one clustering at the largest size.
+
+    The largest-size centroids, weighted by how many stops they hold, are
+    clustered down to each smaller size, which costs almost nothing.
+    """
+    coordinates = df[['latitude', 'longitude']].values
+    largest = KMeans(n_clusters=max(sizes), random_state=42, n_init=10).fit(coordinates)
+    weights = np.bincount(largest.labels_, minlength=max(sizes))
+
+    centroids = {}
+    for size in sizes:
+        if size == max(sizes):
+            centroids[size] = largest.cluster_centers_
+        else:
+            reduced = KMeans(n_clusters=size, random_state=42, n_init=3)
+            reduced.fit(largest.cluster_centers_, sample_weight=weights)
+            centroids[size] = reduced.cluster_centers_
+    return centroids
+
+
+def evaluate_fleet_size(args):
+    """Cluster, balance and route the shared instance for one fleet size"""
+    n_vehicles, init, vehicle_capacity, vehicle_cost = args
+
+    clusterer = DeliveryClusterer(_sweep_df.copy())
+    df, centers = clusterer.kmeans_cluster(n_vehicles, init=init)
+    labels = df['cluster'].values.copy()
+
+    cluster_demand = df.groupby('cluster')['demand'].sum()
+    overloaded = int((cluster_demand > vehicle_capacity).sum())
+
+    df = clusterer.balance_vehicle_capacity(vehicle_capacity=vehicle_capacity)
+
+    total_distance = 0
+    for cluster_id, cluster_df in df.groupby('cluster'):
+        if cluster_id == -1 or len(cluster_df) < 2:
+            continue
+        cluster_dist_matrix = submatrix(_sweep_matrix, cluster_df.index.tolist())
+        _, distance = nearest_neighbor_heuristic(cluster_dist_matrix)
+        total_distance += distance
+
+    n_routes = int(df['cluster'].nunique())
+    return {
+        'n_vehicles': n_vehicles,
+        'n_routes': n_routes,
+        'overloaded_clusters': overloaded,
+        'max_load': int(df.groupby('cluster')['demand'].sum().max()),
+        'total_distance_km': round(float(total_distance), 2),
+        'cost': round(float(total_distance + vehicle_cost * n_routes), 2),
+        'labels': labels,
+        'centers': centers,
+    }
+
+
+def sweep_fleet_sizes(df, distance_matrix, sizes=None, vehicle_capacity=200,
+                      vehicle_cost=DEFAULT_VEHICLE_COST_KM, processes=None):
+    """Evaluate several fleet sizes in parallel and pick the cheapest.
+
+    Cost is total nearest-neighbour route length plus vehicle_cost per
+    route actually dispatched after capacity balancing. Returns the
+    curve ordered by fleet size and the best entry, which also carries the
+    cluster labels and centers so callers need not recluster.
+    """
+    df = df.reset_index(drop=True)
+    if sizes is None:
+        low, high = default_fleet_range(df, vehicle_capacity)
+        sizes = range(low, high + 1)
+    sizes = sorted({int(size) for size in sizes if 1 <= int(size) <= len(df)})
+    if not sizes:
+        raise FleetSizingError(f"No fleet size to try between 1 and {len(df)} stops")
+
+    centroids = warm_start_centroids(df, sizes)
+    tasks = [(size, centroids[size], vehicle_capacity, vehicle_cost) for size in sizes]
+
+    processes = processes or min(len(tasks), multiprocessing.cpu_count())
+    if processes > 1:
+        # Workers map the matrix from shared memory instead of unpickling a copy
+        with shared_matrix(distance_matrix) as matrix_ref:
+            with process_pool(processes, initializer=_init_worker,
+                              initargs=(df, matrix_ref)) as pool:
+                results = pool.map(evaluate_fleet_size, tasks)
+    else:
+        _set_instance(df, distance_matrix)
+        results = [evaluate_fleet_size(task) for task in tasks]
+
+    best = min(results, key=lambda result: result['cost'])
+    curve = [
+        {key: value for key, value in result.items()
+         if key not in ('labels', 'centers')}
+        for result in results
+    ]
+    return {'curve': curve, 'best': best}
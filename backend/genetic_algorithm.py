@@ -1,5 +1,7 @@
 import random
-import numpy as np
+from distance_oracle import route_distance
+from bounds import gap_reached
+from exact_solver import held_karp, EXACT_MAX_STOPS
 
 class GeneticVRP:
     def __init__(self, distance_matrix, population_size=100, generations=200, 
@@ -22,17 +24,12 @@ class GeneticVRP:
     
     def calculate_fitness(self, route):
         """Calculate fitness (inverse of total distance)"""
-        total_distance = 0
-        for i in range(len(route) - 1):
-            total_distance += self.distance_matrix[route[i]][route[i+1]]
+        total_distance = route_distance(route, self.distance_matrix)
         return 1 / (total_distance + 0.001)  # Avoid division by zero
     
     def calculate_distance(self, route):
         """Calculate total route distance"""
-        total_distance = 0
-        for i in range(len(route) - 1):
-            total_distance += self.distance_matrix[route[i]][route[i+1]]
-        return total_distance
+        return route_distance(route, self.distance_matrix)
     
     def rank_population(self, population):
         """Rank population by fitness"""
@@ -130,8 +127,12 @@ class GeneticVRP:
         next_gen = self.mutate_population(children)
         return next_gen
     
-    def evolve(self):
-        """Run genetic algorithm"""
+    def evolve(self, lower_bound=None, target_gap=None):
+        """Run genetic algorithm
+        
+        With a lower_bound and target_gap, stops early once the best route
+        is within target_gap of the bound.
+        """
         population = self.create_population()
         best_distances = []
         
@@ -149,6 +150,10 @@ class GeneticVRP:
             
             if generation % 20 == 0:
                 print(f"Generation {generation}: Best Distance = {best_distance:.2f} km")
+            
+            if gap_reached(best_distance, lower_bound, target_gap):
+                print(f"Generation {generation}: within target gap, stopping")
+                break
         
         # Return best solution
         ranked = self.rank_population(population)
@@ -160,44 +165,21 @@ class GeneticVRP:
         
         return best_route, best_distance, best_distances
 
-def apply_genetic_to_clusters(df, distance_matrix):
-    """Apply genetic algorithm to each cluster separately"""
-    all_routes = []
-    total_distance = 0
+GA_CLUSTER_PARAMS = {'population_size': 50, 'generations': 100, 'mutation_rate': 0.02}
+
+def genetic_route(cluster_dist_matrix, lower_bound=None, target_gap=None,
+                  exact_max_stops=EXACT_MAX_STOPS):
+    """Solve one cluster with the GA
     
-    for cluster_id in df['cluster'].unique():
-        if cluster_id == -1:
-            continue
-        
-        cluster_df = df[df['cluster'] == cluster_id].reset_index(drop=True)
-        
-        if len(cluster_df) < 3:
-            route = [0] + list(range(1, len(cluster_df))) + [0]
-            distance = sum(distance_matrix[route[i]][route[i+1]] 
-                          for i in range(len(route)-1))
-        else:
-            cluster_indices = df[df['cluster'] == cluster_id].index.tolist()
-            cluster_dist_matrix = distance_matrix[np.ix_(cluster_indices, cluster_indices)]
-            
-            ga = GeneticVRP(cluster_dist_matrix, population_size=50, 
-                          generations=100, mutation_rate=0.02)
-            route, distance, _ = ga.evolve()
-        
-        route_coords = [
-            {
-                'customer_id': int(cluster_df.iloc[i]['customer_id']),
-                'latitude': float(cluster_df.iloc[i]['latitude']),
-                'longitude': float(cluster_df.iloc[i]['longitude']),
-                'position': i
-            }
-            for i in route
-        ]
-        
-        all_routes.append({
-            'cluster_id': int(cluster_id),
-            'route': route_coords,
-            'distance_km': round(distance, 2)
-        })
-        total_distance += distance
+    Clusters under three stops are trivial, and clusters of up to
+    exact_max_stops stops are solved optimally with Held-Karp instead.
+    """
+    if len(cluster_dist_matrix) < 3:
+        route = [0] + list(range(1, len(cluster_dist_matrix))) + [0]
+        return route, route_distance(route, cluster_dist_matrix)
+    if len(cluster_dist_matrix) <= exact_max_stops:
+        return held_karp(cluster_dist_matrix)
     
-    return all_routes, total_distance
+    ga = GeneticVRP(cluster_dist_matrix, **GA_CLUSTER_PARAMS)
+    route, distance, _ = ga.evolve(lower_bound, target_gap)
+    return route, distance
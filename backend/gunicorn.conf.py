@@ -0,0 +1,27 @@
+import gc
+import multiprocessing
+import os
+
+# Production entry point: gunicorn -c gunicorn.conf.py
+wsgi_app = 'app:app'
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('WEB_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Optimization requests are CPU bound and can run for a while
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Import the app (and its shared state) once in the master before forking
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's view, so that
+    # gc passes in the workers don't dirty the copy-on-write pages
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Shared state loaded, forking {workers} workers x {threads} threads")
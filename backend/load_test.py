@@ -0,0 +1,96 @@
+"""Measure request throughput of the production server for several worker counts.
+
+Usage: python load_test.py --workers 1 2 4 --requests 200 --concurrency 16
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def wait_until_ready(url, timeout=60):
+    """Poll the server until it answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            post(url + '/api/traffic-analysis', {})
+            return True
+        except Exception:
+            time.sleep(0.5)
+    return False
+
+
+def post(url, payload):
+    body = json.dumps(payload).encode()
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=300) as response:
+        return response.status
+
+
+def run_load(url, payload, n_requests, concurrency):
+    """Fire n_requests at the endpoint and return (requests/sec, failures)"""
+    def one(_):
+        try:
+            return post(url, payload) == 200
+        except Exception:
+            return False
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n_requests)))
+    elapsed = time.time() - start
+
+    return n_requests / elapsed, results.count(False)
+
+
+def start_server(workers, threads, port):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS=str(threads),
+               BIND=f'127.0.0.1:{port}')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--endpoint', default='/api/full-optimization')
+    parser.add_argument('--num-customers', type=int, default=50)
+    args = parser.parse_args()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    payload = {'num_customers': args.num_customers, 'n_vehicles': 5}
+
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'failed':>7}")
+    baseline = None
+
+    for n_workers in args.workers:
+        server = start_server(n_workers, args.threads, args.port)
+        try:
+            if not wait_until_ready(base_url):
+                print(f"{n_workers:>8}  server did not start")
+                continue
+
+            # Warm-up so first-request costs don't skew the measurement
+            run_load(base_url + args.endpoint, payload, n_workers, n_workers)
+            throughput, failed = run_load(
+                base_url + args.endpoint, payload, args.requests, args.concurrency
+            )
+            baseline = baseline or throughput
+            print(f"{n_workers:>8} {throughput:>10.2f} {throughput / baseline:>7.2f}x {failed:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,502 @@
+from datetime import datetime
+import functools
+import numpy as np
+import pandas as pd
+from alns import ALNS
+from bounds import tour_lower_bound, optimality_gap
+from clustering import DeliveryClusterer
+from data_loader import generate_sample_data
+from distance_oracle import DistanceOracle, submatrix
+from exact_solver import held_karp, EXACT_MAX_STOPS
+from fleet_sweep import (sweep_fleet_sizes, parse_fleet_range, FleetSizingError,
+                         DEFAULT_VEHICLE_COST_KM)
+from genetic_algorithm import GA_CLUSTER_PARAMS, genetic_route
+from route_cache import canonical_start
+from route_optimizer import nearest_neighbor_heuristic, two_opt
+from schedule import ScheduleEvaluator, TIME_EPSILON
+from shared_state import DENSE_MATRIX_LIMIT
+from space_filling import hilbert_routes, windowed_two_opt_batch
+
+TWO_OPT_PARAMS = {'init': 'nearest_neighbor'}
+
+IMPROVER_NAMES = {
+    'two_opt': '2-Opt Heuristic',
+    'genetic': 'Genetic Algorithm',
+    'alns': 'Adaptive Large Neighborhood Search',
+    'window': 'Windowed 2-Opt',
+}
+
+
+def stage(method):
+    """Run a pipeline stage at most once and keep its output on the pipeline"""
+    @functools.wraps(method)
+    def wrapper(self):
+        if method.__name__ not in self.results:
+            self.results[method.__name__] = method(self)
+        return self.results[method.__name__]
+    return wrapper
+
+
+def cost_variant(use_traffic):
+    """Name of the cost matrix a route is solved on, for the route cache"""
+    if use_traffic:
+        # Traffic costs are bucketed by the hour they were priced for
+        return f"traffic-{datetime.now().hour}"
+    return 'plain'
+
+
+class RoutingPipeline:
+    """One optimization request as explicit, memoized stages.
+
+        ingest -> cluster -> balance -> matrix -> construct -> improve -> serialize
+
+    Calling a stage runs the stages it depends on, each at most once per
+    pipeline. Solved routes are also memoized across requests through the
+    route cache, and distance matrices through the shared state. Routes are
+    kept as closed lists of row indices into the ingested frame.
+
+    Pass method=None to keep an existing 'cluster' column, and
+    vehicle_capacity=None to skip capacity balancing. With target_gap, the
+    2-opt and genetic improvers stop once a route is within that fraction of
+    its tour lower bound. Clusters of 3 to exact_max_stops stops skip the
+    heuristics and are solved exactly.
+
+    construction='hilbert' replaces clustering and nearest-neighbour
+    construction: stops are ordered along a Hilbert curve and the order is
+    cut into routes by vehicle capacity, which scales to very large
+    manifests. Pair it with improver='window' for a cheap local polish.
+    Per-route lower bounds are reported unless report_bounds=False; by
+    default they are skipped for Hilbert construction, where they would
+    dominate the runtime.
+
+    The schedule stage times the improved routes against each stop's time
+    window with hour-dependent traffic, which gives every stop its ETA.
+    """
+
+    def __init__(self, shared_state, route_cache, traffic_api=None, deliveries=None,
+                 num_customers=50, method='kmeans', n_vehicles=5, vehicle_capacity=200,
+                 use_traffic=False, improver='two_opt', time_budget=2.0, fleet_options=None,
+                 target_gap=None, exact_max_stops=EXACT_MAX_STOPS,
+                 construction='nearest_neighbor', polish_window=8, report_bounds=None):
+        self.shared_state = shared_state
+        self.route_cache = route_cache
+        self.traffic_api = traffic_api
+        self.deliveries = deliveries
+        self.num_customers = num_customers
+        self.method = method
+        self.n_vehicles = n_vehicles
+        self.vehicle_capacity = vehicle_capacity
+        self.use_traffic = use_traffic
+        self.improver = improver
+        self.time_budget = time_budget
+        self.fleet_options = fleet_options or {}
+        self.target_gap = target_gap
+        self.exact_max_stops = exact_max_stops
+        self.construction = construction
+        self.polish_window = polish_window
+        if report_bounds is None:
+            report_bounds = construction != 'hilbert'
+        self.report_bounds = report_bounds
+        self.variant = cost_variant(use_traffic)
+
+        self.results = {}
+        self._columns = None
+        self._cluster_frames = {}
+        self._bounds = {}
+
+    # ----- stages -----------------------------------------------------------
+
+    @stage
+    def ingest(self):
+        if self.deliveries is None:
+            return generate_sample_data(self.num_customers)
+        return pd.DataFrame(self.deliveries).reset_index(drop=True)
+
+    @stage
+    def cluster(self):
+        """Cluster labels before balancing, plus method-specific details"""
+        df = self.ingest()
+        if self.construction == 'hilbert':
+            df = df.copy()
+            df['cluster'], rank = hilbert_routes(df, self.vehicle_capacity or 200)
+            return {'df': df, 'n_clusters': int(df['cluster'].max()) + 1 if len(df) else 0,
+                    'rank': rank}
+        if self.method is None:
+            return {'df': df}
+
+        df = df.copy()
+        clusterer = DeliveryClusterer(df)
+        if self.method != 'kmeans':
+            if self.n_vehicles == 'auto':
+                raise FleetSizingError("n_vehicles='auto' needs K-Means; DBSCAN picks its own clusters")
+            df, n_clusters, n_outliers = clusterer.dbscan_cluster()
+            return {'df': df, 'n_clusters': n_clusters, 'n_outliers': n_outliers}
+
+        if self.n_vehicles != 'auto':
+            df, centers = clusterer.kmeans_cluster(self.n_vehicles)
+            return {'df': df, 'centers': centers}
+
+        sweep = self.fleet_sweep(df)
+        df['cluster'] = sweep['best']['labels']
+        return {'df': df, 'centers': sweep['best']['centers'], 'sweep': sweep}
+
+    @stage
+    def balance(self):
+        df = self.cluster()['df']
+        # Hilbert routes are cut to capacity already
+        if self.vehicle_capacity is None or self.construction == 'hilbert':
+            return df
+        clusterer = DeliveryClusterer(df.copy())
+        return clusterer.balance_vehicle_capacity(vehicle_capacity=self.vehicle_capacity)
+
+    @stage
+    def groups(self):
+        """Row indices of every cluster, in order of first appearance"""
+        labels = self.balance()['cluster']
+        indices = labels.groupby(labels, sort=False).indices
+        return {cluster_id: indices[cluster_id] for cluster_id in pd.unique(labels)}
+
+    @stage
+    def matrix(self):
+        df = self.balance()
+        if self.use_traffic:
+            if not self.traffic_api.enabled or len(df) > DENSE_MATRIX_LIMIT:
+                # Synthetic traffic is one multiplier for the hour: price it
+                # lazily, and only densify small instances
+                oracle = DistanceOracle.from_dataframe(
+                    df, hour=datetime.now().hour,
+                    traffic_profile=self.shared_state.traffic_profile)
+                return oracle if len(df) > DENSE_MATRIX_LIMIT else oracle.to_dense()
+            print("Fetching real-time traffic data...")
+            return self.traffic_api.update_distance_matrix_with_traffic(df, sample_size=20)
+        return self.shared_state.distance_matrix_for(df)
+
+    @stage
+    def construct(self):
+        """Nearest-neighbour route for every cluster with two or more stops"""
+        if self.construction == 'hilbert':
+            return self.construct_hilbert()
+
+        routes = {}
+        for cluster_id, indices in self.routable_clusters(min_stops=2):
+            cluster_matrix = self.cluster_matrix(cluster_id)
+            cluster_frame = self.cluster_frame(cluster_id)
+            # Start from a stop that does not depend on row order, so the
+            # cached tour is the same however the cluster's rows arrive
+            start = canonical_start(cluster_frame)
+            local_route, distance = self.route_cache.solve(
+                cluster_frame, self.variant, 'nearest_neighbor', None,
+                lambda: nearest_neighbor_heuristic(cluster_matrix, start)
+            )
+            routes[cluster_id] = self.make_route(cluster_id, local_route, distance)
+        return routes
+
+    @stage
+    def improve(self):
+        print(f"Running {IMPROVER_NAMES[self.improver]} optimization...")
+        return getattr(self, f'improve_{self.improver}')()
+
+    @stage
+    def schedule(self):
+        """ETAs and time-window lateness of the improved routes, as arrays"""
+        routes = self.improve()
+        df = self.balance()
+        # Traffic is applied per hour here, so time the routes on plain distances
+        matrix = self.shared_state.distance_matrix_for(df) if self.use_traffic else self.matrix()
+        evaluator = ScheduleEvaluator(matrix, df, self.shared_state.traffic_profile)
+        schedule = evaluator.evaluate([route['stops'] for route in routes.values()])
+        schedule['rows'] = {cluster_id: row for row, cluster_id in enumerate(routes)}
+        # Rounded once here rather than per serialized route
+        schedule['eta_hours'] = schedule['arrival'].round(2)
+        schedule['late_minutes'] = (schedule['late'] * 60).round(1)
+        return schedule
+
+    @stage
+    def serialize(self):
+        before = self.construct()
+        after = self.improve()
+        lower_bound = None
+        if self.report_bounds:
+            lower_bound = sum(self.route_bound(route) for route in after.values())
+        return {
+            'before_routes': [self.route_to_dict(route) for route in before.values()],
+            'after_routes': [self.route_to_dict(route, include_bound=self.report_bounds,
+                                                include_schedule=True)
+                             for route in after.values()],
+            'before_distance_km': sum(route['distance'] for route in before.values()),
+            'after_distance_km': sum(route['distance'] for route in after.values()),
+            'lower_bound_km': lower_bound,
+            'schedule': self.schedule_summary(),
+        }
+
+    # ----- constructors -------------------------------------------------------
+
+    def construct_hilbert(self):
+        """Every route visits its stops in Hilbert-curve order.
+
+        All routes are laid out along one ordering of the rows, so their
+        distances come from a single batched lookup.
+        """
+        labels = self.balance()['cluster'].values
+        order = np.lexsort((self.cluster()['rank'], labels))
+        route_labels = labels[order]
+        starts = np.flatnonzero(np.r_[True, route_labels[1:] != route_labels[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+
+        # Each stop's successor along its route, wrapping to the route's first stop
+        following = np.r_[order[1:], order[:1]]
+        following[ends - 1] = order[starts]
+        distances = np.add.reduceat(
+            np.asarray(self.matrix()[order, following], dtype=float), starts
+        )
+
+        stops = order.tolist()
+        routes = {}
+        for start, end, distance in zip(starts.tolist(), ends.tolist(), distances.tolist()):
+            if end - start >= 2:
+                cluster_id = route_labels[start].item()
+                routes[cluster_id] = self.route_record(cluster_id, stops[start:end] + [stops[start]],
+                                                       distance)
+        return routes
+
+    # ----- improvers ----------------------------------------------------------
+
+    def improve_two_opt(self):
+        routes = {}
+        for cluster_id, constructed in self.construct().items():
+            cluster_matrix = self.cluster_matrix(cluster_id)
+            local_route, distance = self.solve_cluster(
+                cluster_id, 'two_opt', self.solver_params(TWO_OPT_PARAMS),
+                lambda: two_opt(constructed['positions'], cluster_matrix,
+                                self.stopping_bound(cluster_id), self.target_gap)
+            )
+            routes[cluster_id] = self.make_route(cluster_id, local_route, distance)
+        return routes
+
+    def improve_window(self):
+        """2-opt limited to short segments, for routes that are already spatially ordered.
+
+        Every route is polished together in one batch on the full matrix.
+        """
+        constructed = self.construct()
+        if self.polish_window < 1:
+            return constructed
+        polished, distances = windowed_two_opt_batch(
+            [route['stops'] for route in constructed.values()], self.matrix(), self.polish_window
+        )
+        return {
+            cluster_id: self.route_record(cluster_id, stops, distance)
+            for cluster_id, stops, distance in zip(constructed, polished, distances.tolist())
+        }
+
+    def improve_genetic(self):
+        routes = {}
+        for cluster_id, indices in self.routable_clusters(min_stops=1):
+            cluster_matrix = self.cluster_matrix(cluster_id)
+            local_route, distance = self.solve_cluster(
+                cluster_id, 'genetic', self.solver_params(GA_CLUSTER_PARAMS),
+                lambda: genetic_route(cluster_matrix, self.stopping_bound(cluster_id),
+                                      self.target_gap, self.exact_max_stops)
+            )
+            routes[cluster_id] = self.make_route(cluster_id, local_route, distance)
+        return routes
+
+    def improve_alns(self):
+        """Improve all constructed routes jointly; outliers get inserted too.
+
+        Stops may change route, so a copy of the balanced frame with the
+        final route ids is kept for routed_deliveries(); the memoized stages
+        keep their own labels.
+        """
+        constructed = self.construct()
+        initial_routes = [route['stops'][:-1] for route in constructed.values()]
+        unassigned = []
+        for cluster_id, indices in self.groups().items():
+            if cluster_id == -1:
+                unassigned.extend(indices.tolist())
+            elif cluster_id not in constructed:
+                initial_routes.append(indices.tolist())
+
+        df = self.balance()
+        alns = ALNS(self.matrix(), df['demand'].values, self.vehicle_capacity or 200,
+                    time_budget=self.time_budget, route_cost=self.vehicle_cost())
+        stops, total_distance, self.results['alns_stats'] = alns.solve(initial_routes, unassigned)
+        print(f"ALNS: {self.results['alns_stats']['iterations']} iterations, {total_distance:.2f} km")
+
+        labels = df['cluster'].values.copy()
+        routes = {}
+        for route_id, route in enumerate(stops):
+            labels[route[:-1]] = route_id
+            routes[route_id] = {
+                'cluster_id': route_id,
+                'stops': route,
+                'positions': None,
+                'distance': alns.costs[route_id],
+            }
+        self.results['alns_deliveries'] = df.assign(cluster=labels)
+        return routes
+
+    # ----- helpers ------------------------------------------------------------
+
+    def vehicle_cost(self):
+        """Fixed cost of one more route, in km"""
+        return self.fleet_options.get('vehicle_cost_km', DEFAULT_VEHICLE_COST_KM)
+
+    def fleet_sweep(self, df):
+        """Pick n_vehicles for a request that passed n_vehicles='auto'"""
+        sizes = None
+        if self.fleet_options.get('fleet_range'):
+            sizes = parse_fleet_range(self.fleet_options['fleet_range'])
+
+        return sweep_fleet_sizes(
+            df, self.shared_state.distance_matrix_for(df), sizes,
+            vehicle_capacity=self.vehicle_capacity or 200,
+            vehicle_cost=self.vehicle_cost()
+        )
+
+    def routable_clusters(self, min_stops):
+        for cluster_id, indices in self.groups().items():
+            if cluster_id != -1 and len(indices) >= min_stops:
+                yield cluster_id, indices
+
+    def cluster_frame(self, cluster_id):
+        if cluster_id not in self._cluster_frames:
+            indices = self.groups()[cluster_id]
+            self._cluster_frames[cluster_id] = self.balance().iloc[indices].reset_index(drop=True)
+        return self._cluster_frames[cluster_id]
+
+    def cluster_matrix(self, cluster_id):
+        return submatrix(self.matrix(), self.groups()[cluster_id])
+
+    def solve_cluster(self, cluster_id, solver, params, solve_fn):
+        """Solve one cluster through the route cache, exactly if it is small enough"""
+        if 3 <= len(self.groups()[cluster_id]) <= self.exact_max_stops:
+            cluster_matrix = self.cluster_matrix(cluster_id)
+            solver, params = 'held_karp', None
+            solve_fn = lambda: held_karp(cluster_matrix)
+        return self.route_cache.solve(
+            self.cluster_frame(cluster_id), self.variant, solver, params, solve_fn
+        )
+
+    def solver_params(self, params):
+        """Solver parameters as they enter the route cache key"""
+        if self.target_gap is None:
+            return params
+        return dict(params, target_gap=self.target_gap)
+
+    def cluster_bound(self, cluster_id):
+        """Tour lower bound over a cluster's stops, computed once"""
+        if cluster_id not in self._bounds:
+            self._bounds[cluster_id] = tour_lower_bound(self.cluster_matrix(cluster_id))
+        return self._bounds[cluster_id]
+
+    def stopping_bound(self, cluster_id):
+        if self.target_gap is None:
+            return None
+        return self.cluster_bound(cluster_id)
+
+    def route_bound(self, route):
+        if route['positions'] is not None:
+            return self.cluster_bound(route['cluster_id'])
+        # Routes not tied to a cluster (ALNS) are bounded over their own stops
+        return tour_lower_bound(submatrix(self.matrix(), route['stops'][:-1]))
+
+    def make_route(self, cluster_id, local_route, distance):
+        indices = self.groups()[cluster_id]
+        return {
+            'cluster_id': cluster_id,
+            'stops': [int(indices[i]) for i in local_route],
+            'positions': list(local_route),
+            'distance': float(distance),
+        }
+
+    def route_record(self, cluster_id, stops, distance):
+        """Route from closed global stops; positions are looked up per stop"""
+        positions = self.local_positions()
+        return {
+            'cluster_id': cluster_id,
+            'stops': stops,
+            'positions': [positions[i] for i in stops],
+            'distance': float(distance),
+        }
+
+    def local_positions(self):
+        """Position of every row within its cluster, as in groups()"""
+        if 'local_positions' not in self.results:
+            labels = self.balance()['cluster']
+            self.results['local_positions'] = labels.groupby(labels).cumcount().tolist()
+        return self.results['local_positions']
+
+    def columns(self):
+        """Per-stop fields for serializing, as plain lists built once per pipeline"""
+        if self._columns is None:
+            df = self.balance()
+            self._columns = (df['customer_id'].astype(int).tolist(),
+                             df['latitude'].astype(float).tolist(),
+                             df['longitude'].astype(float).tolist())
+        return self._columns
+
+    def route_to_dict(self, route, include_position=False, include_bound=False,
+                      include_schedule=False):
+        """JSON-ready route; include_schedule needs a route from improve()"""
+        customer_ids, latitudes, longitudes = self.columns()
+        if include_schedule:
+            schedule = self.schedule()
+            row = schedule['rows'][route['cluster_id']]
+            arrivals = schedule['eta_hours'][row].tolist()
+            late = schedule['late_minutes'][row].tolist()
+
+        route_coords = []
+        for k, i in enumerate(route['stops']):
+            point = {
+                'customer_id': customer_ids[i],
+                'latitude': latitudes[i],
+                'longitude': longitudes[i]
+            }
+            if include_position:
+                point['position'] = route['positions'][k]
+            if include_schedule:
+                point['eta_hours'] = arrivals[k]
+                point['late_minutes'] = late[k]
+            route_coords.append(point)
+
+        route_dict = {
+            'cluster_id': int(route['cluster_id']),
+            'route': route_coords,
+            'distance_km': round(route['distance'], 2)
+        }
+        if include_bound:
+            lower_bound = self.route_bound(route)
+            route_dict['lower_bound_km'] = round(lower_bound, 2)
+            route_dict['gap_percent'] = round(optimality_gap(route['distance'], lower_bound) * 100, 2)
+        if include_schedule:
+            route_dict['shift_end_hours'] = round(float(schedule['shift_end'][row]), 2)
+            route_dict['wait_minutes'] = round(float(schedule['wait'][row].sum()) * 60, 1)
+            route_dict['on_time'] = bool(schedule['on_time'][row])
+        return route_dict
+
+    def schedule_summary(self):
+        schedule = self.schedule()
+        late = schedule['late'] > TIME_EPSILON
+        return {
+            'on_time_routes': int(schedule['on_time'].sum()),
+            'late_stops': int(late.sum()),
+            'total_late_minutes': round(float(schedule['late'].sum()) * 60, 1),
+            'total_wait_minutes': round(float(schedule['wait'].sum()) * 60, 1),
+            'latest_shift_end_hours': round(float(schedule['shift_end'].max()), 2)
+                                      if len(schedule['shift_end']) else None,
+        }
+
+    def routed_deliveries(self):
+        """Balanced deliveries labelled with the route each stop ended up on"""
+        self.improve()
+        return self.results.get('alns_deliveries', self.balance())
+
+    def fleet_sweep_summary(self):
+        sweep = self.cluster().get('sweep')
+        if sweep is None:
+            return None
+        return {
+            'curve': sweep['curve'],
+            'best_n_vehicles': sweep['best']['n_vehicles']
+        }
@@ -0,0 +1,132 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+
+def cluster_key(cluster_df, variant, solver, params=None):
+    """Canonical hash of a cluster's stops, cost variant and solver settings.
+
+    Stops are sorted by customer_id so row order does not matter. Cached
+    routes are closed tours, so they are rotated onto whichever stop the
+    cluster starts from on a hit; solvers whose tour depends on where they
+    start should start from canonical_start().
+    """
+    stops = sorted(
+        (int(cid), float(lat), float(lon))
+        for cid, lat, lon in zip(
+            cluster_df['customer_id'], cluster_df['latitude'], cluster_df['longitude']
+        )
+    )
+    payload = {
+        'stops': stops,
+        'variant': variant,
+        'solver': solver,
+        'params': params or {},
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def canonical_start(cluster_df):
+    """Row of the stop with the smallest customer_id, whatever the row order"""
+    return int(cluster_df['customer_id'].values.argmin())
+
+
+def rotate_tour(route, start):
+    """Rotate a closed tour so it leaves from and returns to start"""
+    body = list(route[:-1])
+    if len(body) == 0 or start not in body:
+        return list(route)
+    k = body.index(start)
+    body = body[k:] + body[:k]
+    return body + [body[0]]
+
+
+class RouteCache:
+    """LRU cache of solved cluster routes with an optional sqlite store on disk.
+
+    Routes are stored as customer ids, so a hit can be mapped back onto a
+    cluster whose rows arrive in a different order. Returned routes always
+    start and end at the cluster's first row.
+    """
+
+    def __init__(self, max_entries=4096, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def _connection(self):
+        # Connections must not cross a fork, so each worker opens its own
+        if self.path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS routes (key TEXT PRIMARY KEY, value TEXT)'
+            )
+            self._db_pid = os.getpid()
+        return self._db
+
+    def get(self, key):
+        """Return (route customer ids, distance) or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            db = self._connection()
+            if db is None:
+                return None
+            row = db.execute('SELECT value FROM routes WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+
+            value = tuple(json.loads(row[0]))
+            self._remember(key, value)
+            return value
+
+    def put(self, key, route_ids, distance):
+        value = ([int(cid) for cid in route_ids], float(distance))
+        with self._lock:
+            self._remember(key, value)
+            db = self._connection()
+            if db is not None:
+                db.execute(
+                    'INSERT OR REPLACE INTO routes (key, value) VALUES (?, ?)',
+                    (key, json.dumps(value))
+                )
+                db.commit()
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def solve(self, cluster_df, variant, solver, params, solve_fn):
+        """Return (route positions, distance) from the cache or by calling solve_fn.
+
+        The route is a closed tour rotated to start at position 0; rotating
+        keeps its edges, so the distance still holds.
+        """
+        key = cluster_key(cluster_df, variant, solver, params)
+        customer_ids = cluster_df['customer_id'].tolist()
+
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            route_ids, distance = cached
+            position = {int(cid): i for i, cid in enumerate(customer_ids)}
+            return rotate_tour([position[cid] for cid in route_ids], 0), distance
+
+        self.misses += 1
+        route, distance = solve_fn()
+        self.put(key, [customer_ids[i] for i in route], distance)
+        return rotate_tour(list(route), 0), distance
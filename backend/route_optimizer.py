@@ -1,27 +1,103 @@
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
+import gc
+import random
 import numpy as np
+from distance_oracle import DistanceOracle, route_distance
+from strategy_log import record_race, rank_strategies
+from bounds import vrp_lower_bound, gap_reached, optimality_gap
+from worker_pool import process_pool, shared_matrix, attach_matrix
+
+DEFAULT_STRATEGY = 'PATH_CHEAPEST_ARC/GUIDED_LOCAL_SEARCH'
+
+# First-solution strategy / local-search metaheuristic pairs raced in portfolio mode
+DEFAULT_PORTFOLIO = [
+    'PATH_CHEAPEST_ARC/GUIDED_LOCAL_SEARCH',
+    'SAVINGS/GUIDED_LOCAL_SEARCH',
+    'PARALLEL_CHEAPEST_INSERTION/SIMULATED_ANNEALING',
+    'CHRISTOFIDES/TABU_SEARCH',
+]
+
+# Further pairs adaptive mode can explore once it has winners to lean on
+EXPLORATION_POOL = DEFAULT_PORTFOLIO + [
+    'PATH_CHEAPEST_ARC/SIMULATED_ANNEALING',
+    'PATH_CHEAPEST_ARC/TABU_SEARCH',
+    'SAVINGS/TABU_SEARCH',
+    'PARALLEL_CHEAPEST_INSERTION/GUIDED_LOCAL_SEARCH',
+    'LOCAL_CHEAPEST_INSERTION/GUIDED_LOCAL_SEARCH',
+    'CHRISTOFIDES/GUIDED_LOCAL_SEARCH',
+]
+
+# Adaptive races: this many past winners plus one exploratory pair
+ADAPTIVE_WINNERS = 2
+
+
+def adaptive_portfolio(n_nodes, winners=ADAPTIVE_WINNERS, rng=random):
+    """Past winners on similar-sized instances plus one pair not among them.
+
+    Without any history the default portfolio is raced in full.
+    """
+    ranked = [s for s in rank_strategies(n_nodes) if s in EXPLORATION_POOL][:winners]
+    if not ranked:
+        return list(DEFAULT_PORTFOLIO)
+    untried = [s for s in EXPLORATION_POOL if s not in ranked]
+    return ranked + ([rng.choice(untried)] if untried else [])
 
 class VRPOptimizer:
-    def __init__(self, distance_matrix, demands, vehicle_capacity, num_vehicles):
+    def __init__(self, distance_matrix, demands, vehicle_capacity, num_vehicles, time_limit=30,
+                 target_gap=None):
         self.distance_matrix = distance_matrix
         self.demands = demands
         self.vehicle_capacity = vehicle_capacity
         self.num_vehicles = num_vehicles
+        self.time_limit = time_limit
+        self.target_gap = target_gap
+    
+    def scaled_matrix(self):
+        """Integer costs in metres, as OR-Tools expects"""
+        if isinstance(self.distance_matrix, DistanceOracle):
+            return self.distance_matrix.scaled(1000)
+        return (np.asarray(self.distance_matrix) * 1000).astype(np.int64)
         
-    def create_data_model(self):
+    def create_data_model(self, scaled_matrix=None):
         """Store problem data"""
         data = {}
-        data['distance_matrix'] = (self.distance_matrix * 1000).astype(int).tolist()
-        data['demands'] = self.demands.tolist()
+        if scaled_matrix is None:
+            scaled_matrix = self.scaled_matrix()
+        data['distance_matrix'] = scaled_matrix
+        data['demands'] = np.asarray(self.demands).tolist()
         data['vehicle_capacities'] = [self.vehicle_capacity] * self.num_vehicles
         data['num_vehicles'] = self.num_vehicles
         data['depot'] = 0
         return data
     
-    def solve(self):
-        """Solve VRP using OR-Tools"""
-        data = self.create_data_model()
+    def solve(self, portfolio=False, strategies=None, adaptive=False):
+        """Solve VRP using OR-Tools
+        
+        With portfolio=True several strategies race in parallel under the
+        same time limit and the best solution wins (see solve_portfolio).
+        """
+        if portfolio:
+            return self.solve_portfolio(strategies, adaptive)
+        return self.solve_with_strategy(DEFAULT_STRATEGY)
+    
+    def lower_bound(self, scaled_matrix):
+        """Lower bound on the objective, in the scaled matrix's units.
+
+        With many vehicles even this bound can sit well below the optimum
+        (see vrp_lower_bound), so target_gap stops the search early only
+        on instances where the bound is close.
+        """
+        return vrp_lower_bound(scaled_matrix, self.demands, self.vehicle_capacity)
+    
+    def solve_with_strategy(self, strategy, data=None, lower_bound=None):
+        """Solve with one 'FIRST_SOLUTION/METAHEURISTIC' strategy pair.
+        
+        lower_bound, if given, is used for target_gap instead of computing one.
+        """
+        if data is None:
+            data = self.create_data_model()
+        first_solution, metaheuristic = strategy.split('/')
         
         manager = pywrapcp.RoutingIndexManager(
             len(data['distance_matrix']),
@@ -34,7 +110,7 @@ class VRPOptimizer:
         def distance_callback(from_index, to_index):
             from_node = manager.IndexToNode(from_index)
             to_node = manager.IndexToNode(to_index)
-            return data['distance_matrix'][from_node][to_node]
+            return int(data['distance_matrix'][from_node, to_node])
         
         transit_callback_index = routing.RegisterTransitCallback(distance_callback)
         routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
@@ -53,20 +129,77 @@ class VRPOptimizer:
         )
         
         search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-        search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+        search_parameters.first_solution_strategy = getattr(
+            routing_enums_pb2.FirstSolutionStrategy, first_solution
         )
-        search_parameters.local_search_metaheuristic = (
-            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+        search_parameters.local_search_metaheuristic = getattr(
+            routing_enums_pb2.LocalSearchMetaheuristic, metaheuristic
         )
-        search_parameters.time_limit.seconds = 30
+        search_parameters.time_limit.FromMilliseconds(int(self.time_limit * 1000))
+        
+        if self.target_gap is not None:
+            if lower_bound is None:
+                lower_bound = self.lower_bound(data['distance_matrix'])
+            
+            def stop_within_gap():
+                if gap_reached(routing.CostVar().Value(), lower_bound, self.target_gap):
+                    routing.solver().FinishCurrentSearch()
+            
+            routing.AddAtSolutionCallback(stop_within_gap)
         
         solution = routing.SolveWithParameters(search_parameters)
         
         if solution:
-            return self.extract_routes(data, manager, routing, solution)
+            result = self.extract_routes(data, manager, routing, solution)
+            result['strategy'] = strategy
+            if lower_bound is not None:
+                result['lower_bound'] = lower_bound
+                result['gap'] = optimality_gap(result['objective_value'], lower_bound)
+            return result
         return None
     
+    def solve_portfolio(self, strategies=None, adaptive=False, max_strategies=4):
+        """Race strategy pairs in separate processes and keep the best solution.
+        
+        The integer cost matrix is placed in shared memory once and every
+        worker maps it instead of receiving a copy. With adaptive=True only
+        the strategies that won most often on similar-sized instances race,
+        plus one exploratory pair (see adaptive_portfolio), so fewer
+        processes share the machine. Each race is recorded in the strategy
+        log.
+        """
+        n_nodes = len(self.distance_matrix)
+        if strategies is None:
+            strategies = adaptive_portfolio(n_nodes) if adaptive else list(DEFAULT_PORTFOLIO)
+        strategies = strategies[:max_strategies]
+        
+        demands = np.asarray(self.demands).tolist()
+        scaled = self.scaled_matrix()
+        # One bound for the whole race rather than one per member
+        lower_bound = self.lower_bound(scaled) if self.target_gap is not None else None
+        with shared_matrix(scaled) as matrix_ref:
+            tasks = [
+                (matrix_ref, demands, self.vehicle_capacity, self.num_vehicles,
+                 self.time_limit, self.target_gap, lower_bound, strategy)
+                for strategy in strategies
+            ]
+            with process_pool(len(tasks)) as pool:
+                results = pool.map(_solve_portfolio_member, tasks)
+        
+        race = [
+            {'strategy': strategy,
+             'objective': result['objective_value'] if result else None}
+            for strategy, result in zip(strategies, results)
+        ]
+        solved = [result for result in results if result]
+        best = min(solved, key=lambda result: result['objective_value']) if solved else None
+        
+        record_race(n_nodes, self.num_vehicles, race, best['strategy'] if best else None)
+        
+        if best:
+            best['portfolio'] = race
+        return best
+    
     def extract_routes(self, data, manager, routing, solution):
         """Extract route information from solution"""
         routes = []
@@ -104,6 +237,33 @@ class VRPOptimizer:
             'objective_value': solution.ObjectiveValue()
         }
 
+def _solve_portfolio_member(task):
+    """Worker side of solve_portfolio: map the shared matrix and solve"""
+    (matrix_ref, demands, vehicle_capacity, num_vehicles, time_limit, target_gap,
+     lower_bound, strategy) = task
+    
+    scaled, shm = attach_matrix(matrix_ref)
+    try:
+        return _solve_member(scaled, demands, vehicle_capacity, num_vehicles,
+                             time_limit, target_gap, lower_bound, strategy)
+    finally:
+        if shm is not None:
+            # Views into the buffer must be gone before it can be closed
+            scaled = None
+            gc.collect()
+            shm.close()
+
+def _solve_member(scaled, demands, vehicle_capacity, num_vehicles, time_limit, target_gap,
+                  lower_bound, strategy):
+    try:
+        optimizer = VRPOptimizer(scaled, demands, vehicle_capacity, num_vehicles, time_limit,
+                                 target_gap)
+        data = optimizer.create_data_model(scaled_matrix=scaled)
+        return optimizer.solve_with_strategy(strategy, data, lower_bound)
+    except Exception as e:
+        print(f"Strategy {strategy} failed: {e}")
+        return None
+
 def nearest_neighbor_heuristic(distance_matrix, start=0):
     """Simple nearest neighbor algorithm"""
     n = len(distance_matrix)
@@ -115,8 +275,9 @@ def nearest_neighbor_heuristic(distance_matrix, start=0):
     total_distance = 0
     
     while unvisited:
-        nearest = min(unvisited, key=lambda x: distance_matrix[current][x])
-        total_distance += distance_matrix[current][nearest]
+        row = distance_matrix[current]
+        nearest = min(unvisited, key=lambda x: row[x])
+        total_distance += row[nearest]
         route.append(nearest)
         current = nearest
         unvisited.remove(nearest)
@@ -126,13 +287,17 @@ def nearest_neighbor_heuristic(distance_matrix, start=0):
     
     return route, total_distance
 
-def two_opt(route, distance_matrix):
-    """2-opt improvement heuristic"""
+def two_opt(route, distance_matrix, lower_bound=None, target_gap=None):
+    """2-opt improvement heuristic
+    
+    With a lower_bound and target_gap, stops as soon as the route is
+    within target_gap of the bound.
+    """
     improved = True
     best_route = route[:]
     best_distance = calculate_route_distance(route, distance_matrix)
     
-    while improved:
+    while improved and not gap_reached(best_distance, lower_bound, target_gap):
         improved = False
         for i in range(1, len(route) - 2):
             for j in range(i + 1, len(route)):
@@ -154,4 +319,4 @@ def two_opt(route, distance_matrix):
 
 def calculate_route_distance(route, distance_matrix):
     """Calculate total route distance"""
-    return sum(distance_matrix[route[i]][route[i+1]] for i in range(len(route)-1))
+    return route_distance(route, distance_matrix)
@@ -0,0 +1,175 @@
+import numpy as np
+
+DEFAULT_SPEED_KMH = 40
+SHIFT_START_HOUR = 8.0
+# Slack for float comparisons, in hours (well under a second)
+TIME_EPSILON = 1e-6
+
+
+def column(df, name, default):
+    if name in df:
+        return df[name].values.astype(float)
+    return np.full(len(df), default, dtype=float)
+
+
+class ScheduleEvaluator:
+    """Arrival times, waiting and lateness for whole route sets.
+
+    Times are hours since midnight. A leg takes its distance at
+    avg_speed_kmh, scaled by the traffic multiplier of the hour the vehicle
+    leaves. Routes are closed lists of row indices into df: each vehicle is
+    at its first stop at shift_start and the shift ends when it gets back.
+    Stops are served from time_window_start and should start by
+    time_window_end (hours), taking service_time minutes.
+
+    evaluate() schedules every route together: routes are padded into one
+    array and each pass advances all of them by one stop. Its result also
+    feeds insertion_feasible() and two_opt_feasible(), which check a single
+    move without rescheduling the route. Those checks hold later legs at
+    their current traffic multipliers, so they are approximate when a move
+    pushes a leg into another hour; evaluate() is exact.
+    """
+
+    def __init__(self, distance_matrix, df, traffic_profile,
+                 avg_speed_kmh=DEFAULT_SPEED_KMH, shift_start=SHIFT_START_HOUR):
+        self.distance_matrix = distance_matrix
+        self.traffic_profile = np.asarray(traffic_profile, dtype=float)
+        self.avg_speed_kmh = avg_speed_kmh
+        self.shift_start = shift_start
+
+        self.window_start = column(df, 'time_window_start', 0.0)
+        self.window_end = column(df, 'time_window_end', np.inf)
+        self.service_hours = column(df, 'service_time', 0.0) / 60
+
+    def distances(self, origins, destinations):
+        return np.asarray(self.distance_matrix[np.asarray(origins), np.asarray(destinations)],
+                          dtype=float)
+
+    def travel_hours(self, distance, depart):
+        hour = np.floor(depart).astype(int) % len(self.traffic_profile)
+        return distance * self.traffic_profile[hour] / self.avg_speed_kmh
+
+    def evaluate(self, routes):
+        """Schedule every route at once.
+
+        Returns a dict of (n_routes, longest route) arrays, padded past each
+        route's length: arrival, start, depart (NaN padding), wait and late
+        (zero padding, in hours) and latest, the latest service start that
+        keeps the rest of the route on time. Per route: lengths, shift_end,
+        on_time.
+        """
+        lengths = np.array([len(route) for route in routes], dtype=int)
+        n_routes = len(routes)
+        width = int(lengths.max()) if n_routes else 0
+        rows = np.arange(n_routes)
+
+        valid = np.arange(width)[None, :] < lengths[:, None]
+        stops = np.zeros((n_routes, width), dtype=int)
+        if n_routes:
+            stops[valid] = np.concatenate([np.asarray(route, dtype=int) for route in routes])
+
+        # All leg distances in one lookup
+        legs = np.zeros((n_routes, max(width - 1, 0)))
+        leg_valid = valid[:, 1:]
+        legs[leg_valid] = self.distances(stops[:, :-1][leg_valid], stops[:, 1:][leg_valid])
+
+        # The last position is the return to the first stop: no window, no service
+        last = lengths - 1
+        is_stop = np.arange(width)[None, :] < last[:, None]
+        window_start = np.where(is_stop, self.window_start[stops], -np.inf)
+        window_end = np.where(is_stop, self.window_end[stops], np.inf)
+        service = np.where(is_stop, self.service_hours[stops], 0.0)
+
+        arrival = np.full((n_routes, width), np.nan)
+        start = np.full((n_routes, width), np.nan)
+        depart = np.full((n_routes, width), np.nan)
+        travel = np.zeros((n_routes, max(width - 1, 0)))
+
+        clock = np.full(n_routes, float(self.shift_start))
+        for k in range(width):
+            active = valid[:, k]
+            if k > 0:
+                travel[:, k - 1] = np.where(active, self.travel_hours(legs[:, k - 1], clock), 0.0)
+                clock = clock + travel[:, k - 1]
+            arrival[active, k] = clock[active]
+            clock = np.maximum(clock, window_start[:, k])
+            start[active, k] = clock[active]
+            clock = clock + service[:, k]
+            depart[active, k] = clock[active]
+
+        wait = np.nan_to_num(start - arrival)
+        late = np.maximum(np.nan_to_num(start - window_end, nan=0.0, neginf=0.0), 0.0)
+
+        # Backward pass: latest start at each stop that keeps every later stop
+        # on time, holding each leg's traffic multiplier from the forward pass
+        latest = np.full((n_routes, width), np.inf)
+        for k in range(width - 2, -1, -1):
+            downstream = latest[:, k + 1] - travel[:, k] - service[:, k]
+            latest[:, k] = np.where(is_stop[:, k], np.minimum(window_end[:, k], downstream), np.inf)
+
+        shift_end = arrival[rows, last] if n_routes else np.zeros(0)
+        return {
+            'stops': stops,
+            'lengths': lengths,
+            'arrival': arrival,
+            'start': start,
+            'depart': depart,
+            'wait': wait,
+            'late': late,
+            'latest': latest,
+            'shift_end': shift_end,
+            'on_time': (late <= TIME_EPSILON).all(axis=1),
+        }
+
+    def insertion_feasible(self, schedule, route_index, stop):
+        """Whether inserting stop before each position 1..length-1 of a route stays on time.
+
+        Returns a boolean array, one entry per insertion position, computed
+        in one vectorized pass from the route's departures and latest starts.
+        """
+        length = schedule['lengths'][route_index]
+        stops = schedule['stops'][route_index, :length]
+        previous, following = stops[:-1], stops[1:]
+        leave_previous = schedule['depart'][route_index, :length - 1]
+
+        to_stop = self.distances(previous, np.full(len(previous), stop))
+        from_stop = self.distances(np.full(len(following), stop), following)
+
+        arrive = leave_previous + self.travel_hours(to_stop, leave_previous)
+        begin = np.maximum(arrive, self.window_start[stop])
+        feasible = begin <= self.window_end[stop] + TIME_EPSILON
+
+        leave = begin + self.service_hours[stop]
+        arrive_next = leave + self.travel_hours(from_stop, leave)
+        is_return = np.arange(1, length) == length - 1
+        begin_next = np.where(is_return, arrive_next,
+                              np.maximum(arrive_next, self.window_start[following]))
+        feasible &= begin_next <= schedule['latest'][route_index, 1:length] + TIME_EPSILON
+        # Stops before the insertion keep their times, so they must already be on time
+        prefix_on_time = np.cumsum(schedule['late'][route_index, :length - 1] > TIME_EPSILON) == 0
+        return feasible & prefix_on_time
+
+    def two_opt_feasible(self, schedule, route_index, i, j):
+        """Whether reversing positions i..j of a route (1 <= i < j < length - 1) stays on time.
+
+        Only the reversed segment is rescheduled; the rest of the route is
+        covered by the latest start at position j + 1.
+        """
+        length = schedule['lengths'][route_index]
+        if (schedule['late'][route_index, :i] > TIME_EPSILON).any():
+            return False
+        stops = schedule['stops'][route_index, :length]
+        path = np.concatenate([stops[i - 1:i], stops[i:j + 1][::-1], stops[j + 1:j + 2]])
+        legs = self.distances(path[:-1], path[1:])
+
+        clock = schedule['depart'][route_index, i - 1]
+        for k, stop in enumerate(path[1:-1]):
+            clock = max(clock + float(self.travel_hours(legs[k], clock)), self.window_start[stop])
+            if clock > self.window_end[stop] + TIME_EPSILON:
+                return False
+            clock += self.service_hours[stop]
+
+        clock += float(self.travel_hours(legs[-1], clock))
+        if j + 1 < length - 1:
+            clock = max(clock, self.window_start[path[-1]])
+        return clock <= schedule['latest'][route_index, j + 1] + TIME_EPSILON
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+from data_loader import create_distance_matrix, SAMPLE_DATA_PATH
+from distance_oracle import DistanceOracle, submatrix
+from traffic_predictor import TrafficPredictor
+
+# Standing depots/customers shared by every worker; unset means none
+STANDING_LOCATIONS_PATH = os.getenv('STANDING_LOCATIONS_PATH')
+EARTH_RADIUS_KM = 6371
+# Above this many stops a dense n x n matrix is replaced by a lazy oracle
+DENSE_MATRIX_LIMIT = 2000
+
+
+class SharedState:
+    """Read-only structures built once before workers fork.
+
+    Under a preforking server these arrays are inherited by every worker
+    copy-on-write, so none of them is rebuilt per process or per request.
+    """
+
+    def __init__(self, locations_path=STANDING_LOCATIONS_PATH):
+        self.traffic_profile = TrafficPredictor().traffic_profile
+        self.traffic_profile.setflags(write=False)
+
+        self.locations = None
+        self.coordinates = None
+        self.distance_matrix = None
+        self.spatial_index = None
+
+        if not locations_path:
+            return
+        if os.path.abspath(locations_path) == os.path.abspath(SAMPLE_DATA_PATH):
+            # Request handlers rewrite this file, so it can't be trusted at boot
+            print(f"✗ Shared state: {locations_path} is rewritten per request, not loading it")
+        elif os.path.exists(locations_path):
+            self.load_standing_locations(pd.read_csv(locations_path))
+        else:
+            print(f"✗ Shared state: {locations_path} not found")
+
+    def load_standing_locations(self, locations):
+        """Precompute the distance matrix and spatial index of the standing stops.
+
+        Above DENSE_MATRIX_LIMIT stops the matrix is a lazy DistanceOracle.
+        """
+        self.locations = locations.reset_index(drop=True)
+        self.coordinates = self.locations[['latitude', 'longitude']].values.astype(float)
+        self.coordinates.setflags(write=False)
+
+        if len(self.locations) > DENSE_MATRIX_LIMIT:
+            self.distance_matrix = DistanceOracle(self.coordinates)
+        else:
+            self.distance_matrix = create_distance_matrix(self.locations)
+            self.distance_matrix.setflags(write=False)
+
+        self.spatial_index = BallTree(np.radians(self.coordinates), metric='haversine')
+
+        print(f"✓ Shared state: {len(self.locations)} standing locations precomputed")
+
+    def match_standing(self, df, tolerance_km=1e-6):
+        """Map each row of df to a standing location, or None if any row is unknown"""
+        if self.spatial_index is None or len(df) == 0:
+            return None
+
+        query = np.radians(df[['latitude', 'longitude']].values.astype(float))
+        distances, indices = self.spatial_index.query(query, k=1)
+
+        if np.any(distances[:, 0] * EARTH_RADIUS_KM > tolerance_km):
+            return None
+        return indices[:, 0]
+
+    def distance_matrix_for(self, df):
+        """Slice the shared matrix for df, or build a fresh one if any stop is unknown"""
+        indices = self.match_standing(df)
+        if indices is None:
+            if len(df) > DENSE_MATRIX_LIMIT:
+                return DistanceOracle.from_dataframe(df)
+            return create_distance_matrix(df)
+        matrix = submatrix(self.distance_matrix, indices)
+        if isinstance(matrix, DistanceOracle) and len(indices) <= DENSE_MATRIX_LIMIT:
+            return matrix.to_dense()
+        return matrix
+
+
+_shared_state = None
+
+
+def get_shared_state():
+    """Return the process-wide shared state, building it on first use"""
+    global _shared_state
+    if _shared_state is None:
+        _shared_state = SharedState()
+    return _shared_state
@@ -0,0 +1,142 @@
+import numpy as np
+
+HILBERT_ORDER = 16
+
+
+def hilbert_index(latitudes, longitudes, order=HILBERT_ORDER):
+    """Position of every point along a Hilbert curve over their bounding box.
+
+    Coordinates are snapped to a 2^order x 2^order grid; all points are
+    processed together, one bit level at a time.
+    """
+    side = 1 << order
+
+    def to_grid(values):
+        values = np.asarray(values, dtype=float)
+        span = values.max() - values.min() if len(values) else 0
+        if span == 0:
+            return np.zeros(len(values), dtype=np.int64)
+        return ((values - values.min()) / span * (side - 1)).astype(np.int64)
+
+    x = to_grid(longitudes)
+    y = to_grid(latitudes)
+    index = np.zeros(len(x), dtype=np.int64)
+
+    s = side >> 1
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        index += s * s * ((3 * rx) ^ ry)
+
+        # Rotate the quadrant so the curve stays continuous
+        flip = (ry == 0) & (rx == 1)
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        swap = ry == 0
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+
+    return index
+
+
+def cut_by_capacity(demands, vehicle_capacity):
+    """Route id for each stop when an ordered sequence is cut into loads.
+
+    A new route starts whenever the next stop would overflow the current
+    one; a stop heavier than the capacity gets a route to itself.
+    """
+    demands = np.asarray(demands)
+    cumulative = np.cumsum(demands)
+    route_ids = np.empty(len(demands), dtype=int)
+
+    start = 0
+    route_id = 0
+    while start < len(demands):
+        base = cumulative[start - 1] if start else 0
+        end = int(np.searchsorted(cumulative, base + vehicle_capacity, side='right'))
+        end = max(end, start + 1)
+        route_ids[start:end] = route_id
+        route_id += 1
+        start = end
+    return route_ids
+
+
+def hilbert_routes(df, vehicle_capacity):
+    """Order stops along the Hilbert curve and cut the order into vehicle routes.
+
+    Returns (route id per row, rank of each row along the curve).
+    """
+    curve = hilbert_index(df['latitude'].values, df['longitude'].values)
+    order = np.argsort(curve, kind='stable')
+
+    rank = np.empty(len(order), dtype=int)
+    rank[order] = np.arange(len(order))
+
+    labels = np.empty(len(order), dtype=int)
+    labels[order] = cut_by_capacity(df['demand'].values[order], vehicle_capacity)
+    return labels, rank
+
+
+def windowed_two_opt_batch(routes, distance_matrix, window=8, max_passes=5):
+    """Windowed 2-opt on many closed routes at once.
+
+    Routes are padded into one array and advanced in lockstep: for each
+    position i, every route prices its moves (i, j) with j - i <= window by
+    their four changed edges in one batched lookup, and applies its best
+    improving one. A pass is O(longest route x window) array work, whatever
+    the number of routes. Routes under four stops are left as they are.
+
+    Returns (routes as lists, distances).
+    """
+    lengths = np.array([len(route) for route in routes], dtype=int)
+    width = int(lengths.max()) if len(routes) else 0
+    valid = np.arange(width)[None, :] < lengths[:, None]
+    stops = np.zeros((len(routes), width), dtype=int)
+    if len(routes):
+        stops[valid] = np.concatenate([np.asarray(route, dtype=int) for route in routes])
+
+    offsets = np.arange(1, window + 1)
+    polishable = lengths >= 5
+    for _ in range(max_passes if window >= 1 else 0):
+        improved = False
+        for i in range(1, width - 2):
+            js = i + offsets
+            # Moves need j <= length - 2, so the closing stop stays in place
+            allowed = polishable[:, None] & (js[None, :] <= lengths[:, None] - 2)
+            rows = np.flatnonzero(allowed[:, 0])
+            if len(rows) == 0:
+                continue
+            allowed = allowed[rows]
+            clipped = np.minimum(js, width - 2)
+
+            a = np.repeat(stops[rows, i - 1], window)
+            b = np.repeat(stops[rows, i], window)
+            c = stops[rows][:, clipped].ravel()
+            d = stops[rows][:, clipped + 1].ravel()
+            # One batched lookup for the added (a-c, b-d) and removed (a-b, c-d) edges
+            edges = np.asarray(distance_matrix[np.concatenate([a, b, a, c]),
+                                               np.concatenate([c, d, b, d])], dtype=float)
+            added_ac, added_bd, removed_ab, removed_cd = edges.reshape(4, len(rows), window)
+            delta = np.where(allowed, added_ac + added_bd - removed_ab - removed_cd, np.inf)
+
+            best = np.argmin(delta, axis=1)
+            moving = delta[np.arange(len(rows)), best] < -1e-12
+            if not moving.any():
+                continue
+            improved = True
+
+            # Reverse stops i..j of each moving route, touching only the window
+            rows, span = rows[moving], best[moving] + 1
+            end = min(i + window + 1, width)
+            k = np.arange(end - i)[None, :]
+            source = np.where(k <= span[:, None], span[:, None] - k, k)
+            stops[rows, i:end] = np.take_along_axis(stops[rows, i:end], source, axis=1)
+        if not improved:
+            break
+
+    leg_valid = valid[:, 1:]
+    legs = np.zeros((len(routes), max(width - 1, 0)))
+    legs[leg_valid] = np.asarray(
+        distance_matrix[stops[:, :-1][leg_valid], stops[:, 1:][leg_valid]], dtype=float
+    )
+    return [stops[r, :lengths[r]].tolist() for r in range(len(routes))], legs.sum(axis=1)
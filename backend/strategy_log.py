@@ -0,0 +1,46 @@
+from collections import Counter
+import json
+import math
+import os
+
+STRATEGY_LOG_PATH = os.getenv('STRATEGY_LOG_PATH', 'data/strategy_log.jsonl')
+
+
+def size_bucket(n_nodes):
+    """Instances are compared by size on a log2 scale"""
+    return int(math.log2(max(n_nodes, 1)))
+
+
+def record_race(n_nodes, num_vehicles, results, winner, path=STRATEGY_LOG_PATH):
+    """Append the outcome of one portfolio race as a JSON line"""
+    entry = {
+        'n_nodes': n_nodes,
+        'bucket': size_bucket(n_nodes),
+        'num_vehicles': num_vehicles,
+        'results': results,
+        'winner': winner,
+    }
+    try:
+        with open(path, 'a') as log:
+            log.write(json.dumps(entry) + '\n')
+    except OSError as e:
+        print(f"Could not record strategy race: {e}")
+
+
+def rank_strategies(n_nodes, path=STRATEGY_LOG_PATH):
+    """Strategies that won races on similar-sized instances, most wins first"""
+    if not os.path.exists(path):
+        return []
+
+    bucket = size_bucket(n_nodes)
+    wins = Counter()
+    with open(path) as log:
+        for line in log:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('bucket') == bucket and entry.get('winner'):
+                wins[entry['winner']] += 1
+
+    return [strategy for strategy, _ in wins.most_common()]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from alns import ALNS
+from distance_oracle import DistanceOracle, route_distance
+
+
+def instance(n, seed):
+    rng = np.random.default_rng(seed)
+    coordinates = np.column_stack([40.7 + rng.random(n) * 0.3, -74.0 + rng.random(n) * 0.3])
+    demands = rng.integers(1, 40, n)
+    return DistanceOracle(coordinates), demands
+
+
+def overloaded_routes(n, n_routes, seed):
+    """Routes that ignore capacity, plus a few stops left unassigned"""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(n)
+    unassigned = order[:n // 10].tolist()
+    return [route.tolist() for route in np.array_split(order[n // 10:], n_routes)], unassigned
+
+
+def assert_feasible(routes, distance, matrix, demands, capacity):
+    visited = [stop for route in routes for stop in route[:-1]]
+    assert sorted(visited) == list(range(len(demands)))
+    for route in routes:
+        assert route[0] == route[-1]
+        assert demands[route[:-1]].sum() <= capacity
+    assert distance == pytest.approx(sum(route_distance(route, matrix) for route in routes))
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('time_budget', [0.3, 0.0])
+def test_every_stop_is_routed_once_within_capacity(seed, time_budget):
+    # A zero budget exercises the deadline paths of capacity repair
+    matrix, demands = instance(300, seed)
+    routes, unassigned = overloaded_routes(300, 5, seed)
+    alns = ALNS(matrix, demands, 200, time_budget=time_budget, seed=seed)
+
+    solved, distance, stats = alns.solve(routes, unassigned)
+
+    assert_feasible(solved, distance, matrix, demands, 200)
+    assert stats['repaired_stops'] > 0
+    assert stats['routes'] == len(solved)
+
+
+def test_dense_matrix_and_route_cost():
+    matrix, demands = instance(120, 7)
+    dense = matrix.to_dense()
+    routes, unassigned = overloaded_routes(120, 3, 7)
+
+    results = {}
+    for route_cost in (0, 1000):
+        alns = ALNS(dense, demands, 200, time_budget=0.3, route_cost=route_cost)
+        solved, distance, _ = alns.solve(routes, unassigned)
+        assert_feasible(solved, distance, dense, demands, 200)
+        results[route_cost] = len(solved)
+    # Routes that cost more are opened more sparingly
+    assert results[1000] <= results[0]
@@ -0,0 +1,97 @@
+import itertools
+import numpy as np
+import pytest
+from bounds import tour_lower_bound, vrp_lower_bound
+from distance_oracle import DistanceOracle, route_distance
+from exact_solver import held_karp
+
+
+def brute_force(matrix):
+    """Shortest closed tour from stop 0 by trying every order"""
+    n = len(matrix)
+    best = np.inf
+    for order in itertools.permutations(range(1, n)):
+        route = (0,) + order + (0,)
+        best = min(best, sum(matrix[route[k], route[k + 1]] for k in range(n)))
+    return best
+
+
+def random_instances(symmetric, count=100, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        n = int(rng.integers(3, 9))
+        if symmetric:
+            points = rng.random((n, 2)) * 50
+            matrix = np.sqrt(((points[:, None] - points[None]) ** 2).sum(-1))
+        else:
+            matrix = rng.random((n, n)) * 50
+            np.fill_diagonal(matrix, 0)
+        yield matrix
+
+
+@pytest.mark.parametrize('symmetric', [True, False])
+def test_held_karp_matches_brute_force(symmetric):
+    for matrix in random_instances(symmetric):
+        route, distance = held_karp(matrix)
+        assert route[0] == route[-1] == 0
+        assert sorted(route[:-1]) == list(range(len(matrix)))
+        assert distance == pytest.approx(route_distance(route, matrix))
+        assert distance == pytest.approx(brute_force(matrix))
+
+
+@pytest.mark.parametrize('symmetric', [True, False])
+def test_lower_bound_never_exceeds_optimum(symmetric):
+    for matrix in random_instances(symmetric, seed=1):
+        assert tour_lower_bound(matrix) <= brute_force(matrix) + 1e-9
+
+
+def brute_force_vrp(matrix, demands, capacity):
+    """Shortest set of capacitated routes from depot 0, by splitting every stop order optimally"""
+    n = len(matrix)
+    best = np.inf
+    for order in itertools.permutations(range(1, n)):
+        # cost[k]: cheapest way to serve the first k stops of the order
+        cost = [0.0] + [np.inf] * (n - 1)
+        for start in range(n - 1):
+            load, path = 0, 0.0
+            for end in range(start, n - 1):
+                load += demands[order[end]]
+                if load > capacity:
+                    break
+                path += matrix[order[end - 1], order[end]] if end > start else 0.0
+                route = matrix[0, order[start]] + path + matrix[order[end], 0]
+                cost[end + 1] = min(cost[end + 1], cost[start] + route)
+        best = min(best, cost[-1])
+    return best
+
+
+def test_vrp_lower_bound_never_exceeds_optimum():
+    # Euclidean instances, since the tour bound relies on the triangle inequality
+    rng = np.random.default_rng(3)
+    for matrix in random_instances(True, count=40, seed=3):
+        demands = np.concatenate([[0], rng.integers(1, 10, len(matrix) - 1)])
+        capacity = int(max(demands.max(), rng.integers(5, 20)))
+        assert vrp_lower_bound(matrix, demands, capacity) <= (
+            brute_force_vrp(matrix, demands, capacity) + 1e-9)
+
+
+def test_vrp_lower_bound_on_oracle_stays_lazy(monkeypatch):
+    rng = np.random.default_rng(4)
+    oracle = DistanceOracle(np.column_stack([rng.uniform(12.9, 13.1, 50), rng.uniform(77.5, 77.7, 50)]))
+    demands = np.concatenate([[0], rng.integers(1, 10, 49)])
+    monkeypatch.setattr(DistanceOracle, 'to_dense', lambda self: pytest.fail('densified'))
+    assert vrp_lower_bound(oracle, demands, 20) > 0
+
+
+def test_tiny_clusters():
+    matrix = np.array([[0.0, 3.0], [4.0, 0.0]])
+    assert held_karp(matrix) == ([0, 1, 0], 7.0)
+    assert held_karp(np.zeros((1, 1))) == ([0, 0], 0.0)
+
+
+def test_oracle_input():
+    rng = np.random.default_rng(2)
+    oracle = DistanceOracle(np.column_stack([rng.uniform(12.9, 13.1, 7), rng.uniform(77.5, 77.7, 7)]))
+    _, distance = held_karp(oracle)
+    assert distance == pytest.approx(brute_force(oracle.to_dense()))
+    assert tour_lower_bound(oracle) <= distance + 1e-9
@@ -0,0 +1,41 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+BACKEND = os.path.join(os.path.dirname(__file__), '..')
+
+# Runs in a fresh interpreter so OMP_NUM_THREADS takes effect before any
+# OpenMP runtime loads, and so a hang fails the test instead of pytest
+SWEEP = textwrap.dedent('''
+    import json
+    import numpy as np
+    import pandas as pd
+    from data_loader import create_distance_matrix
+    from fleet_sweep import sweep_fleet_sizes
+
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        'customer_id': np.arange(n),
+        'latitude': 40.7 + rng.random(n) * 0.2,
+        'longitude': -74.0 + rng.random(n) * 0.2,
+        'demand': rng.integers(1, 20, n),
+    })
+    matrix = create_distance_matrix(df)
+    parallel = sweep_fleet_sizes(df, matrix, range(20, 28), processes=2)
+    serial = sweep_fleet_sizes(df, matrix, range(20, 28), processes=1)
+    print(json.dumps([parallel['curve'], serial['curve']]))
+''')
+
+
+def test_parallel_sweep_with_openmp_threads_completes():
+    env = dict(os.environ, OMP_NUM_THREADS='2')
+    result = subprocess.run([sys.executable, '-c', SWEEP], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+
+    parallel, serial = json.loads(result.stdout.strip().splitlines()[-1])
+    assert [entry['n_vehicles'] for entry in parallel] == list(range(20, 28))
+    assert parallel == serial
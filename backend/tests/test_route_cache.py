@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data_loader import create_distance_matrix
+from distance_oracle import route_distance
+from exact_solver import held_karp
+from route_cache import RouteCache, canonical_start
+from route_optimizer import nearest_neighbor_heuristic, two_opt
+
+
+def cluster(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'customer_id': rng.permutation(np.arange(100, 100 + n)),
+        'latitude': 40.7 + rng.random(n) * 0.1,
+        'longitude': -74.0 + rng.random(n) * 0.1,
+    })
+
+
+def shuffled(df, seed):
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+SOLVERS = {
+    'held_karp': held_karp,
+    'two_opt': lambda matrix: two_opt(nearest_neighbor_heuristic(matrix)[0], matrix),
+}
+
+
+@pytest.mark.parametrize('solver', sorted(SOLVERS))
+def test_closed_tour_hits_when_rows_are_shuffled(solver):
+    cache = RouteCache()
+    df = cluster()
+    cache.solve(df, 'plain', solver, None, lambda: SOLVERS[solver](create_distance_matrix(df)))
+
+    for seed in range(5):
+        other = shuffled(df, seed)
+        matrix = create_distance_matrix(other)
+        route, distance = cache.solve(other, 'plain', solver, None,
+                                      lambda: pytest.fail('expected a cache hit'))
+        assert route[0] == route[-1] == 0
+        assert sorted(route[:-1]) == list(range(len(other)))
+        assert distance == pytest.approx(route_distance(route, matrix))
+    assert (cache.hits, cache.misses) == (5, 1)
+
+
+def test_nearest_neighbor_starts_canonically():
+    cache = RouteCache()
+    df = cluster()
+    results = []
+    for seed in range(5):
+        other = shuffled(df, seed)
+        matrix = create_distance_matrix(other)
+        start = canonical_start(other)
+        assert other['customer_id'].iloc[start] == df['customer_id'].min()
+
+        route, distance = cache.solve(other, 'plain', 'nearest_neighbor', None,
+                                      lambda: nearest_neighbor_heuristic(matrix, start))
+        assert route[0] == route[-1] == 0
+        assert distance == pytest.approx(route_distance(route, matrix))
+        results.append(distance)
+    assert (cache.hits, cache.misses) == (4, 1)
+    assert results == pytest.approx([results[0]] * 5)
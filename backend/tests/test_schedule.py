@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data_loader import create_distance_matrix
+from schedule import ScheduleEvaluator
+
+FLAT = np.full(24, 1.3)
+# Traffic that changes every hour, so delayed legs land on a different multiplier
+ALTERNATING = 1.0 + 0.8 * (np.arange(24) % 2)
+
+
+def instance(seed, n=60, n_routes=6):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'latitude': 40.6 + rng.random(n) * 0.36,
+        'longitude': -74.1 + rng.random(n) * 0.47,
+        'time_window_start': rng.uniform(8, 14, n),
+        'service_time': rng.uniform(5, 15, n),
+    })
+    df['time_window_end'] = df['time_window_start'] + rng.uniform(3, 8, n)
+    # Stops in window order, so that about half of all moves stay on time
+    routes = []
+    for part in np.array_split(rng.permutation(n), n_routes):
+        part = part[np.argsort(df['time_window_start'].values[part])]
+        routes.append(part.tolist() + [part[0]])
+    return df, create_distance_matrix(df), routes
+
+
+def insertion_moves(routes):
+    """(route index, stop, position, new route) for every stop inserted into every other route"""
+    for r, route in enumerate(routes):
+        for other, donor in enumerate(routes):
+            if other == r:
+                continue
+            for stop in donor[:-1:3]:
+                for position in range(1, len(route)):
+                    yield r, stop, position, route[:position] + [stop] + route[position:]
+
+
+def two_opt_moves(routes):
+    """(route index, i, j, new route) for every reversal of positions i..j"""
+    for r, route in enumerate(routes):
+        for i in range(1, len(route) - 2):
+            for j in range(i + 1, len(route) - 1):
+                yield r, i, j, route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+
+
+def exact_on_time(evaluator, route):
+    return bool(evaluator.evaluate([route])['on_time'][0])
+
+
+def held_hours(schedule, r, first, last):
+    """Departure hours of the legs the incremental checks hold at their old multiplier"""
+    return np.floor(schedule['depart'][r, first:last])
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_checks_match_evaluate_under_constant_traffic(seed):
+    df, matrix, routes = instance(seed)
+    evaluator = ScheduleEvaluator(matrix, df, FLAT)
+    schedule = evaluator.evaluate(routes)
+
+    outcomes = []
+    for r, stop, position, new_route in insertion_moves(routes):
+        feasible = evaluator.insertion_feasible(schedule, r, stop)[position - 1]
+        assert feasible == exact_on_time(evaluator, new_route)
+        outcomes.append(feasible)
+    for r, i, j, new_route in two_opt_moves(routes):
+        feasible = evaluator.two_opt_feasible(schedule, r, i, j)
+        assert feasible == exact_on_time(evaluator, new_route)
+        outcomes.append(feasible)
+    assert 0.2 < np.mean(outcomes) < 0.8
+
+
+def test_checks_are_exact_unless_a_held_leg_changes_hour():
+    """Across hours with different traffic the checks are approximate, as documented.
+
+    Any disagreement with evaluate() must come from a later leg that the
+    move pushed into another hour.
+    """
+    df, matrix, routes = instance(0)
+    evaluator = ScheduleEvaluator(matrix, df, ALTERNATING)
+    schedule = evaluator.evaluate(routes)
+
+    shifted = disagreements = checked = 0
+    for r, stop, position, new_route in insertion_moves(routes):
+        length = len(routes[r])
+        after = evaluator.evaluate([new_route])
+        moved = not np.array_equal(held_hours(schedule, r, position, length - 1),
+                                   held_hours(after, 0, position + 1, length))
+        feasible = evaluator.insertion_feasible(schedule, r, stop)[position - 1]
+        if feasible != bool(after['on_time'][0]):
+            disagreements += 1
+            assert moved
+        shifted += moved
+        checked += 1
+
+    for r, i, j, new_route in two_opt_moves(routes):
+        length = len(routes[r])
+        after = evaluator.evaluate([new_route])
+        moved = not np.array_equal(held_hours(schedule, r, j + 1, length - 1),
+                                   held_hours(after, 0, j + 1, length - 1))
+        if evaluator.two_opt_feasible(schedule, r, i, j) != bool(after['on_time'][0]):
+            disagreements += 1
+            assert moved
+        shifted += moved
+        checked += 1
+
+    # The case is exercised, and even this much traffic swing leaves most moves right
+    assert shifted > 0
+    assert disagreements < 0.1 * checked
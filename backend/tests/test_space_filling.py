@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from distance_oracle import route_distance
+from space_filling import windowed_two_opt_batch
+
+
+def test_windowed_two_opt_batch_keeps_routes_closed_and_never_worse():
+    rng = np.random.default_rng(0)
+    points = rng.random((200, 2)) * 50
+    matrix = np.sqrt(((points[:, None] - points[None]) ** 2).sum(-1))
+    stops = rng.permutation(200)
+    routes = [stops[a:b].tolist() for a, b in [(0, 3), (3, 40), (40, 41), (41, 120), (120, 200)]]
+    routes = [route + [route[0]] for route in routes]
+
+    for window in (1, 4, 8):
+        polished, distances = windowed_two_opt_batch(routes, matrix, window=window)
+        for before, after, distance in zip(routes, polished, distances):
+            assert after[0] == after[-1] == before[0]
+            assert sorted(after[:-1]) == sorted(before[:-1])
+            assert distance == pytest.approx(route_distance(after, matrix))
+            assert distance <= route_distance(before, matrix) + 1e-9
+
+
+def test_window_bounds_the_reversed_segment():
+    # On a line visited 0, 2, 1, 3, ... one swap of adjacent stops fixes each pair
+    n = 12
+    positions = np.arange(n, dtype=float)
+    matrix = np.abs(positions[:, None] - positions[None])
+    route = [0, 2, 1, 4, 3, 6, 5, 8, 7, 10, 9, 11, 0]
+
+    polished, distances = windowed_two_opt_batch([route], matrix, window=1)
+    assert polished[0] == list(range(n)) + [0]
+    assert distances[0] == pytest.approx(2 * (n - 1))
+
+    untouched, _ = windowed_two_opt_batch([route], matrix, window=0)
+    assert untouched[0] == route
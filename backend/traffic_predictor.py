@@ -8,6 +8,7 @@ class TrafficPredictor:
     def __init__(self):
         self.model = LinearRegression()
         self.trained = False
+        self._traffic_profile = None
     
     def generate_traffic_patterns(self, hours=24):
         """Generate synthetic traffic multipliers for each hour"""
@@ -26,13 +27,19 @@ class TrafficPredictor:
         
         return traffic
     
+    @property
+    def traffic_profile(self):
+        """Hourly multipliers as an array, generated once per predictor"""
+        if self._traffic_profile is None:
+            self._traffic_profile = np.asarray(self.generate_traffic_patterns())
+        return self._traffic_profile
+    
     def adjust_distance_for_traffic(self, distance, hour):
-        """Adjust distance based on traffic at given hour"""
-        traffic_patterns = self.generate_traffic_patterns()
-        return distance * traffic_patterns[hour]
+        """Adjust distance based on traffic at given hour (scalars or arrays)"""
+        return distance * self.traffic_profile[np.asarray(hour) % len(self.traffic_profile)]
     
     def predict_delivery_time(self, distance_km, hour, avg_speed_kmh=40):
-        """Predict delivery time considering traffic"""
+        """Predict delivery time in minutes considering traffic (scalars or arrays)"""
         adjusted_distance = self.adjust_distance_for_traffic(distance_km, hour)
         time_hours = adjusted_distance / avg_speed_kmh
         return time_hours * 60
@@ -148,9 +155,7 @@ class RealTimeTraffic:
         base_matrix = create_distance_matrix(df)
 
         current_hour = datetime.now().hour
-        predictor = TrafficPredictor()
-        traffic_patterns = predictor.generate_traffic_patterns()
-        multiplier = traffic_patterns[current_hour]
+        multiplier = TrafficPredictor().traffic_profile[current_hour]
         
         print(f"Current hour: {current_hour}:00, Traffic multiplier: {multiplier:.2f}x")
         return base_matrix * multiplier
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import multiprocessing
+import numpy as np
+from distance_oracle import DistanceOracle
+
+# Imported once by the fork server, so every worker starts with them loaded
+WORKER_MODULES = ['fleet_sweep', 'route_optimizer']
+
+
+def pool_context():
+    """Start method for solver worker pools.
+
+    A child forked straight from a process that has run OpenMP or BLAS
+    threads (KMeans, for one) inherits their pools in a broken state and can
+    hang in its first parallel region. Workers therefore come from a fork
+    server, which never runs solver code itself, or are spawned where there
+    is none.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(WORKER_MODULES)
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def process_pool(processes, initializer=None, initargs=()):
+    return pool_context().Pool(processes, initializer=initializer, initargs=initargs)
+
+
+@contextmanager
+def shared_matrix(matrix):
+    """Place a dense matrix in shared memory for the duration of the block.
+
+    Yields a small picklable reference for attach_matrix(). An oracle is only
+    coordinates, so it is cheap to hand over as is and is yielded unchanged.
+    """
+    if isinstance(matrix, DistanceOracle):
+        yield matrix
+        return
+
+    matrix = np.ascontiguousarray(matrix)
+    shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    try:
+        np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+        yield (shm.name, matrix.shape, matrix.dtype.str)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def attach_matrix(ref):
+    """Worker side of shared_matrix: (matrix, handle to close once it is unused)"""
+    if isinstance(ref, DistanceOracle):
+        return ref, None
+    name, shape, dtype = ref
+    shm = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf), shm